@@ -0,0 +1,152 @@
+"""
+Offline benchmark of the image -> FEN pipeline.
+
+Every image of a folder is decoded and run through the pipeline one at a time for a
+number of iterations. The per-stage and end-to-end latency percentiles, the throughput,
+the peak memory and the FEN of every image are written to JSON so runs with other models,
+piece sampling or backends can be compared.
+
+    python benchmark.py --images images/test_images --iterations 10 --pieces_model nano
+"""
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import platform
+import numpy as np
+import board.metrics as metrics
+from board.backends import BACKENDS, PIECES_MODELS
+import run_api
+
+
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(durations):
+    """Latency summary in milliseconds of a list of durations in seconds."""
+    durations = np.asarray(durations) * 1000
+    summary = {f"p{p}": float(np.percentile(durations, p)) for p in PERCENTILES}
+    summary["mean"] = float(durations.mean())
+    summary["count"] = int(durations.size)
+    return summary
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def read_folder(folder):
+    """Reads the encoded bytes of every image in a folder, keyed by file name."""
+    images = {}
+    for filename in sorted(os.listdir(folder)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            with open(os.path.join(folder, filename), "rb") as f:
+                images[filename] = f.read()
+    return images
+
+def seed(value):
+    """Seeds the random numbers of the point sampling and the orientation check."""
+    random.seed(value)
+    np.random.seed(value)
+
+def run_benchmark(images, args):
+    """Runs every image through the pipeline `args.iterations` times, starting from `args.seed`.
+
+    Returns:
+        tuple: End-to-end durations in seconds, stage name -> durations, the FEN
+        of every image in the last iteration and the total wall time.
+    """
+    seed(args.seed)
+    end_to_end = []
+    fens = {}
+    with metrics.recording() as stages:
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            for filename, image_data in images.items():
+                image_start = time.perf_counter()
+                with metrics.timer('decode'):
+                    image, _ = run_api.decode_upload(image_data, args.decode_min_size, args.board_dimension)
+                fens[filename] = run_api.images_to_FEN(
+                    [image], None, run_api.corners_model, run_api.grid_model, run_api.pieces_model,
+                    args.corner_conf, args.corner_iou, args.pieces_conf, args.pieces_iou,
+                    args.offsetx, args.offsety, args.piece_sampling, batch_size=1, dimension=args.board_dimension)[0]
+                end_to_end.append(time.perf_counter() - image_start)
+        wall_time = time.perf_counter() - start
+    return end_to_end, stages, fens, wall_time
+
+
+def parse_args():
+    """Parse input arguments from the command line and the JSON config file.
+
+    Pipeline settings given on the command line override config.json.
+    """
+    with open("config.json", "r") as f:
+        config = json.load(f)
+    parser = argparse.ArgumentParser(description="Benchmark the image to FEN pipeline.")
+    parser.add_argument("--images", default="images/test_images", help="Folder with the benchmark images")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed passes over the images before measuring")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the point sampling and orientation check, so the FENs are reproducible")
+    parser.add_argument("--pieces_model", choices=PIECES_MODELS)
+    parser.add_argument("--backend", choices=BACKENDS)
+    parser.add_argument("--piece_sampling", type=lambda value: value if value == 'analytic' else int(value))
+    parser.add_argument("--inference_threads", type=int)
+    parser.add_argument("--decode_min_size", type=int)
+    parser.add_argument("--board_dimension", type=int)
+    args = parser.parse_args()
+    for key, value in config.items():
+        if getattr(args, key, None) is None:
+            setattr(args, key, value)
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+    run_api.validate_args(args)
+
+    images = read_folder(args.images)
+    if not images:
+        raise ValueError(f"No images found in {args.images}")
+
+    run_api.load_models(args)
+    if args.warmup > 0:
+        warmup_args = argparse.Namespace(**{**vars(args), "iterations": args.warmup})
+        run_benchmark(images, warmup_args)
+
+    print(f"Benchmarking {len(images)} images x {args.iterations} iterations")
+    end_to_end, stages, fens, wall_time = run_benchmark(images, args)
+
+    results = {
+        "config": {
+            "pieces_model": args.pieces_model,
+            "backend": args.backend,
+            "piece_sampling": args.piece_sampling,
+            "inference_threads": args.inference_threads,
+            "decode_min_size": args.decode_min_size,
+            "board_dimension": args.board_dimension,
+            "images": len(images),
+            "iterations": args.iterations,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "end_to_end_ms": summarize(end_to_end),
+        "stages_ms": {stage: summarize(durations) for stage, durations in stages.items()},
+        "images_per_second": len(end_to_end) / wall_time,
+        "peak_rss_mb": peak_rss_mb(),
+        "failed": sorted(filename for filename, fen in fens.items() if fen is None),
+        "fens": fens,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+    e2e = results["end_to_end_ms"]
+    print(f"End to end: p50 {e2e['p50']:.1f} ms, p95 {e2e['p95']:.1f} ms, p99 {e2e['p99']:.1f} ms")
+    for stage, summary in results["stages_ms"].items():
+        print(f"  {stage:<12} p50 {summary['p50']:8.2f} ms  p99 {summary['p99']:8.2f} ms")
+    print(f"{results['images_per_second']:.2f} images/s, peak RSS {results['peak_rss_mb']:.0f} MB")
+    print(f"Results written to {args.output}")
@@ -0,0 +1,172 @@
+"""
+Microbenchmarks of the geometry helpers, without any model.
+
+Synthetic detections are generated for random boards: a random homography places the
+board in the frame, the corner boxes and the grid contour follow from it and 0-32 pieces
+are put on random squares. Every helper is then timed over many iterations on these
+scenes. With a baseline file the run fails when a helper lost more throughput than the
+tolerance allows, so the non-model part of the pipeline stays cheap.
+
+    python benchmark_geometry.py --save_baseline      # on the reference commit
+    python benchmark_geometry.py --tolerance 0.2      # afterwards, exits 1 on a regression or without a baseline
+
+Baselines depend on the machine, compare runs on the same one.
+"""
+import os
+import json
+import time
+import random
+import argparse
+import numpy as np
+import cv2
+import board.corners as corners
+import board.grid as grid
+import board.pieces as pieces
+from board.backends import Boxes, Masks, Results
+from board.geometry import DIMENSION
+
+
+def random_quad(rng, width=1280, height=960):
+    """Random convex board outline in a frame, corners ordered top-left, top-right, bottom-right, bottom-left."""
+    size = rng.uniform(0.45, 0.7) * min(width, height)
+    center = np.array([width / 2, height / 2]) + rng.uniform(-0.1, 0.1, 2) * [width, height]
+    square = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float64) * size / 2
+    # Perspective: the far (top) edge of the board is shorter than the near one
+    square[:2, 0] *= rng.uniform(0.7, 1.0)
+    angle = rng.uniform(-0.3, 0.3)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    quad = square @ rotation.T + center
+    return (quad + rng.normal(0, 3, quad.shape)).astype(np.float32)
+
+def corner_result(quad, rng, box_size=30):
+    """Corner model output with one box per board corner, in random order."""
+    centers = quad[rng.permutation(4)]
+    xyxy = np.hstack([centers - box_size / 2, centers + box_size / 2])
+    return Results(Boxes(xyxy, np.ones(4), np.zeros(4)))
+
+def grid_result(quad, rng, points_per_edge=60):
+    """Grid segmentation output: a noisy contour along the four grid edges."""
+    contour = []
+    for start, end in zip(quad, np.roll(quad, -1, axis=0)):
+        t = np.linspace(0, 1, points_per_edge, endpoint=False)[:, None]
+        contour.append(start + t * (end - start))
+    contour = np.vstack(contour) + rng.normal(0, 1, (4 * points_per_edge, 2))
+    return Results(Boxes(np.zeros((1, 4)), np.ones(1), np.zeros(1)), Masks([contour.astype(np.float32)]))
+
+def piece_boxes(grid_transform, rng, n_pieces):
+    """Piece boxes in the board view standing on random squares of the grid.
+
+    Returns:
+        tuple: Nx4 xywh boxes and N class indices.
+    """
+    if n_pieces == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    square_size = DIMENSION / 8
+    squares = rng.choice(64, n_pieces, replace=False)
+    rows, cols = np.divmod(squares, 8)
+    # Foot of the piece a bit above the bottom edge of its square, in grid coordinates
+    feet = np.stack([(cols + 0.5) * square_size, (rows + 0.75) * square_size], axis=-1)
+    feet = cv2.perspectiveTransform(feet.reshape(-1, 1, 2).astype(np.float64), np.linalg.inv(grid_transform)).reshape(-1, 2)
+    w = rng.uniform(0.6, 0.9, n_pieces) * square_size
+    h = rng.uniform(1.0, 2.0, n_pieces) * square_size
+    boxes = np.stack([feet[:, 0], feet[:, 1] + 0.15 * h - h / 2, w, h], axis=-1)
+    labels = rng.integers(0, len(pieces.predefined_labels), n_pieces)
+    return boxes.astype(np.float32), labels.astype(np.float32)
+
+def make_scene(rng):
+    frame_quad = random_quad(rng)
+    # The grid as it appears in the 640x640 board view after the first warp
+    grid_quad = random_quad(rng, DIMENSION, DIMENSION)
+    grid_quad = (grid_quad - grid_quad.mean(axis=0)) * 1.3 + DIMENSION / 2
+    grid_transform = grid.get_perspective_transform(grid.sort_corners(grid_quad))
+    boxes, labels = piece_boxes(grid_transform, rng, int(rng.integers(0, 33)))
+    sampled = pieces.get_sampled_points(boxes, labels)
+    return {
+        "corners": corner_result(frame_quad, rng),
+        "corner_points": [tuple(point) for point in frame_quad],
+        "grid": grid_result(grid_quad, rng),
+        "grid_points": [tuple(point) for point in grid_quad],
+        "grid_transform": grid_transform,
+        "boxes": boxes,
+        "labels": labels,
+        "confidences": rng.uniform(0.5, 1.0, len(labels)),
+        "sampled": sampled,
+        "mapped": pieces.get_mapped_pieces_analytic(boxes, labels, grid_transform),
+    }
+
+
+CASES = {
+    "get_corner_coordinates": lambda s: corners.get_corner_coordinates([s["corners"]]),
+    "label_and_sort_corners": lambda s: corners.label_and_sort_corners(s["corner_points"]),
+    "sort_corners": lambda s: grid.sort_corners(s["grid_points"]),
+    "get_corners_from_grid_segmentation": lambda s: grid.get_corners_from_grid_segmentation([s["grid"]]),
+    "get_sampled_points": lambda s: pieces.get_sampled_points(s["boxes"], s["labels"]),
+    "get_mapped_pieces": lambda s: pieces.get_mapped_pieces(s["sampled"], s["grid_transform"]),
+    "get_mapped_pieces_vectorized": lambda s: pieces.get_mapped_pieces_vectorized(s["boxes"], s["labels"], s["grid_transform"]),
+    "get_mapped_pieces_analytic": lambda s: pieces.get_mapped_pieces_analytic(s["boxes"], s["labels"], s["grid_transform"]),
+    "get_mapped_pieces_resolved": lambda s: pieces.get_mapped_pieces_resolved(s["boxes"], s["labels"], s["confidences"], s["grid_transform"]),
+    "create_FEN_notation": lambda s: pieces.create_FEN_notation(s["mapped"]),
+}
+
+
+def time_case(function, scenes, iterations, repeats):
+    """Best throughput in calls per second over `repeats` runs of `iterations` calls."""
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(iterations):
+            function(scenes[i % len(scenes)])
+        best = max(best, iterations / (time.perf_counter() - start))
+    return best
+
+def compare(results, baseline, tolerance):
+    """Returns the helpers whose throughput dropped more than `tolerance` below the baseline."""
+    regressions = []
+    for name, ops in results.items():
+        if name in baseline and ops < baseline[name] * (1 - tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def parse_args():
+    """Parse input arguments from the command line."""
+    parser = argparse.ArgumentParser(description="Microbenchmark the geometry helpers on synthetic detections.")
+    parser.add_argument("--scenes", type=int, default=64, help="Number of synthetic boards")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5, help="The best of the repeats is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--baseline", default="geometry_baseline.json")
+    parser.add_argument("--save_baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed throughput loss against the baseline")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    scenes = [make_scene(rng) for _ in range(args.scenes)]
+
+    results = {}
+    for name in args.cases:
+        results[name] = time_case(CASES[name], scenes, args.iterations, args.repeats)
+        print(f"{name:<36} {results[name]:12.0f} calls/s  {1e6 / results[name]:10.1f} us/call")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name in regressions:
+            print(f"Regression: {name} {results[name]:.0f} calls/s, baseline {baseline[name]:.0f} calls/s")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No helper is more than {args.tolerance:.0%} slower than {args.baseline}")
+    else:
+        # Without a baseline nothing is guarded, which must not pass silently
+        print(f"No baseline at {args.baseline}, run with --save_baseline first")
+        raise SystemExit(1)
@@ -0,0 +1,264 @@
+"""
+Inference backends for the YOLO models.
+
+The board modules only call `model.predict(source, conf=..., iou=...)` and read
+`results[i].boxes.xywh / .cls / .conf` and `results[i].masks.xy` from the output.
+OnnxYOLO provides the same interface on top of ONNX Runtime (optionally with the
+OpenVINO execution provider), with letterboxing, NMS and mask decoding in NumPy,
+so PyTorch doesn't have to be loaded at all.
+"""
+import os
+import ast
+import numpy as np
+import cv2
+
+BACKENDS = ['ultralytics', 'onnx', 'openvino']
+PIECES_MODELS = ['large', 'nano', 'large_int8', 'nano_int8']
+
+
+class NumpyTensor(np.ndarray):
+    """NumPy array that also answers the `.cpu().numpy()` calls made on torch tensors."""
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+def as_tensor(array):
+    return np.asarray(array).view(NumpyTensor)
+
+
+class Boxes:
+    def __init__(self, xyxy, conf, cls):
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        xywh = np.empty_like(xyxy)
+        xywh[:, 0] = (xyxy[:, 0] + xyxy[:, 2]) / 2
+        xywh[:, 1] = (xyxy[:, 1] + xyxy[:, 3]) / 2
+        xywh[:, 2] = xyxy[:, 2] - xyxy[:, 0]
+        xywh[:, 3] = xyxy[:, 3] - xyxy[:, 1]
+        self.xyxy = as_tensor(xyxy)
+        self.xywh = as_tensor(xywh)
+        self.conf = as_tensor(np.asarray(conf, dtype=np.float32))
+        self.cls = as_tensor(np.asarray(cls, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.xyxy)
+
+class Masks:
+    def __init__(self, xy):
+        self.xy = xy
+
+    def __len__(self):
+        return len(self.xy)
+
+class Results:
+    def __init__(self, boxes, masks=None, orig_shape=None):
+        self.boxes = boxes
+        self.masks = masks
+        self.orig_shape = orig_shape
+
+
+def letterbox(image, size=640, color=114):
+    """Resizes an image to fit a size x size square keeping the aspect ratio and pads the rest.
+
+    Returns:
+        tuple: The padded image, the scale factor and the (x, y) padding.
+    """
+    h, w = image.shape[:2]
+    gain = min(size / h, size / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(color, color, color))
+    return image, gain, (left, top)
+
+def preprocess(images, size=640):
+    """Letterboxes BGR images and stacks them to a normalized NCHW RGB float batch.
+
+    Returns:
+        tuple: The batch and the (gain, pad, original shape) of every image.
+    """
+    batch, letterboxes = [], []
+    for image in images:
+        padded, gain, pad = letterbox(image, size)
+        batch.append(padded[..., ::-1].transpose(2, 0, 1))  # BGR -> RGB, HWC -> CHW
+        letterboxes.append((gain, pad, image.shape[:2]))
+    batch = np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0
+    return batch, letterboxes
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression on xyxy boxes. Returns the kept indices, highest score first."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][iou <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+class OnnxYOLO:
+    """YOLOv8 detection or segmentation model exported to ONNX, run with ONNX Runtime.
+
+    Args:
+        onnx_path (str): Path to the exported model.
+        providers (list, optional): ONNX Runtime execution providers. Defaults to the CPU provider.
+        max_det (int): Maximum number of detections per image.
+        threads (int, optional): Number of intra-op threads, None lets ONNX Runtime decide.
+    """
+
+    def __init__(self, onnx_path, providers=None, max_det=300, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=providers or ['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.segment = len(self.session.get_outputs()) > 1
+        self.max_det = max_det
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.imgsz = ast.literal_eval(metadata['imgsz'])[0] if 'imgsz' in metadata else 640
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+
+    def predict(self, source, conf=0.25, iou=0.7, **kwargs):
+        """Same call as ultralytics YOLO.predict for images, paths or lists of them.
+
+        Arrays are expected in BGR order, like ultralytics does.
+        """
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        images = [cv2.imread(s) if isinstance(s, str) else s for s in sources]
+        if not images:
+            return []
+
+        batch, letterboxes = preprocess(images, self.imgsz)
+        outputs = self.session.run(None, {self.input_name: batch})
+        predictions = outputs[0]
+        protos = outputs[1] if self.segment else None
+
+        results = []
+        for i, (gain, pad, shape) in enumerate(letterboxes):
+            results.append(self._postprocess(predictions[i], protos[i] if protos is not None else None,
+                                             gain, pad, shape, conf, iou))
+        return results
+
+    def _postprocess(self, prediction, protos, gain, pad, shape, conf, iou):
+        # prediction: (4 + nc (+ 32 mask coefficients), anchors)
+        prediction = prediction.T
+        nm = protos.shape[0] if protos is not None else 0
+        nc = prediction.shape[1] - 4 - nm
+        scores_all = prediction[:, 4:4 + nc]
+        cls = scores_all.argmax(axis=1)
+        scores = scores_all[np.arange(len(cls)), cls]
+        keep = scores > conf
+        prediction, cls, scores = prediction[keep], cls[keep], scores[keep]
+
+        cx, cy, w, h = prediction[:, 0], prediction[:, 1], prediction[:, 2], prediction[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+        # Class aware NMS by moving the boxes of every class far apart
+        offsets = cls[:, None].astype(np.float32) * 7680
+        kept = nms(boxes + offsets, scores, iou)[:self.max_det]
+        boxes, cls, scores = boxes[kept], cls[kept], scores[kept]
+        coefficients = prediction[kept, 4 + nc:] if nm else None
+
+        # Back from the letterboxed input to the original image
+        original = boxes.copy()
+        original[:, [0, 2]] = (original[:, [0, 2]] - pad[0]) / gain
+        original[:, [1, 3]] = (original[:, [1, 3]] - pad[1]) / gain
+        original[:, [0, 2]] = original[:, [0, 2]].clip(0, shape[1])
+        original[:, [1, 3]] = original[:, [1, 3]].clip(0, shape[0])
+
+        masks = None
+        if nm and len(boxes):
+            masks = Masks(self._decode_masks(protos, coefficients, boxes, gain, pad))
+        return Results(Boxes(original, scores, cls), masks, shape)
+
+    def _decode_masks(self, protos, coefficients, boxes, gain, pad):
+        """Turns mask coefficients into polygons in original image coordinates, like masks.xy."""
+        nm, mh, mw = protos.shape
+        if len(coefficients) == 0:
+            return []
+        masks = sigmoid(coefficients @ protos.reshape(nm, -1)).reshape(-1, mh, mw)
+
+        segments = []
+        scale = mw / self.imgsz
+        for mask, box in zip(masks, boxes):
+            # Only keep the mask inside its box
+            x1, y1, x2, y2 = np.round(box * scale).astype(int).clip(0, mw)
+            cropped = np.zeros_like(mask)
+            cropped[y1:y2, x1:x2] = mask[y1:y2, x1:x2]
+            binary = (cv2.resize(cropped, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR) > 0.5).astype(np.uint8)
+            contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            if not contours:
+                segments.append(np.zeros((0, 2), dtype=np.float32))
+                continue
+            contour = max(contours, key=len).reshape(-1, 2).astype(np.float32)
+            contour[:, 0] = (contour[:, 0] - pad[0]) / gain
+            contour[:, 1] = (contour[:, 1] - pad[1]) / gain
+            segments.append(contour)
+        return segments
+
+
+def export_onnx(model_path, imgsz=640):
+    """Exports a YOLO .pt model to ONNX next to it, once.
+
+    Returns:
+        str: Path to the .onnx file.
+    """
+    onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+    if not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < os.path.getmtime(model_path):
+        from ultralytics import YOLO
+        YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    return onnx_path
+
+def pieces_model_path(piece_model):
+    """Path of the pieces model selected in config.json, the INT8 variants are made by quantize.py."""
+    if piece_model not in PIECES_MODELS:
+        raise ValueError(f"Invalid model: {piece_model}")
+    if piece_model.endswith('_int8'):
+        return f'models/pieces_{piece_model}.onnx'
+    return f'models/pieces_{piece_model}.pt'
+
+def load_model(model_path, backend='ultralytics', threads=None):
+    """Loads a YOLO model with the chosen backend.
+
+    Args:
+        model_path (str): Path to the .pt model, or directly to an .onnx model.
+        backend (str): 'ultralytics' (PyTorch), 'onnx' (ONNX Runtime on CPU) or
+            'openvino' (ONNX Runtime with the OpenVINO execution provider).
+        threads (int, optional): Number of inference threads, None or 0 keeps the runtime default.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid backend: {backend}")
+    if backend == 'ultralytics':
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        # ultralytics runs .onnx models with ONNX Runtime itself
+        return YOLO(model_path, task='detect', verbose=False) if model_path.endswith('.onnx') else YOLO(model_path, verbose=False)
+
+    onnx_path = model_path if model_path.endswith('.onnx') else export_onnx(model_path)
+    providers = ['CPUExecutionProvider']
+    if backend == 'openvino':
+        providers = ['OpenVINOExecutionProvider'] + providers
+    return OnnxYOLO(onnx_path, providers=providers, threads=threads)
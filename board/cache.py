@@ -0,0 +1,71 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import board.metrics as metrics
+
+
+class LRUCache:
+    """Thread-safe bounded cache with least-recently-used eviction and an optional time to live.
+
+    Args:
+        maxsize (int): Maximum number of entries, the least recently used one is evicted first.
+        ttl (float, optional): Seconds after which an entry expires. None keeps entries until evicted.
+        name (str, optional): Exports the hits and misses as metrics with this cache label.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, name=None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[1]):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                if self.name is not None:
+                    metrics.CACHE_MISSES.inc(cache=self.name)
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if self.name is not None:
+                metrics.CACHE_HITS.inc(cache=self.name)
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Returns the hit/miss counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+def upload_hash(image_data):
+    """Digest of the uploaded bytes, only identical uploads (e.g. retries) share it.
+
+    A perceptual hash of the frame can't be used here: moving a single piece barely
+    changes a downscaled photo, so the next move would get the previous position.
+    """
+    return hashlib.blake2b(image_data, digest_size=16).digest()
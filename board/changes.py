@@ -0,0 +1,72 @@
+import numpy as np
+import cv2
+from board.corners import warp_roi
+from board.geometry import DIMENSION, square_index
+
+def grid_view(image, grid_transform, corners_transform, size=160, dimension=DIMENSION):
+    """Warps the original frame straight to a small grayscale view of the 8x8 grid.
+
+    Args:
+        image (np.ndarray): Original RGB frame.
+        grid_transform (np.ndarray): Board view -> grid transformation (dimension x dimension grid).
+        corners_transform (np.ndarray): Frame -> board view transformation.
+        size (int): Size of the view, a multiple of 8.
+        dimension (int): Size of the grid image grid_transform maps to.
+    """
+    scale = np.diag([size / dimension, size / dimension, 1.0])
+    M = scale @ np.asarray(grid_transform, dtype=np.float64) @ np.asarray(corners_transform, dtype=np.float64)
+    view = warp_roi(image, M, size)
+    if view.ndim == 3:
+        view = cv2.cvtColor(view, cv2.COLOR_RGB2GRAY)
+    return view
+
+def square_differences(view, reference):
+    """Mean absolute pixel difference per square between two grid views, as an 8x8 array."""
+    size = view.shape[0]
+    cell = size // 8
+    diff = cv2.absdiff(view, reference)[:cell * 8, :cell * 8].astype(np.float32)
+    return diff.reshape(8, cell, 8, cell).mean(axis=(1, 3))
+
+class SquareChangeDetector:
+    """Finds the squares that changed since the last time the pieces were detected.
+
+    The reference view is only replaced when `commit` is called, i.e. after the piece
+    detector ran, so slow changes spread over many frames still add up.
+
+    Args:
+        threshold (float): Mean absolute difference (0-255) above which a square counts as changed.
+    """
+
+    def __init__(self, threshold=12.0):
+        self.threshold = threshold
+        self.reference = None
+
+    def changed_squares(self, view):
+        """Returns an 8x8 boolean array of changed squares (row 0 = rank 8, col 0 = file A).
+
+        Everything counts as changed when there is no reference yet.
+        """
+        if self.reference is None or self.reference.shape != view.shape:
+            return np.ones((8, 8), dtype=bool)
+        return square_differences(view, self.reference) > self.threshold
+
+    def commit(self, view):
+        self.reference = view
+
+    def reset(self):
+        self.reference = None
+
+def merge_mapped_pieces(previous_pieces, new_pieces, changed):
+    """Keeps the previous pieces on unchanged squares and the new detections on changed squares.
+
+    Args:
+        previous_pieces (list): (square, label) tuples of the previous detection.
+        new_pieces (list): (square, label) tuples of the new detection.
+        changed (np.ndarray): 8x8 boolean array from SquareChangeDetector.changed_squares.
+    """
+    def is_changed(square):
+        return changed.flat[square_index(square)]
+
+    kept = [(square, label) for square, label in previous_pieces if not is_changed(square)]
+    updated = [(square, label) for square, label in new_pieces if is_changed(square)]
+    return kept + updated
@@ -1,4 +1,3 @@
-from ultralytics import YOLO
 import numpy as np
 import cv2
 import math
@@ -122,17 +121,16 @@ def get_corner_coordinates(corners, offsetx=0, offsety=0):
     
     return sorted_corners
 
-def transform_image_corners(image, corners):
-    """_summary_
+def get_corners_transform(corners, dimension=640):
+    """Computes the perspective transformation that maps the (offset) board corners
+    onto a dimension x dimension image.
 
     Args:
-        image (_type_): _description_
-        corners (_type_): _description_
+        corners (list): Corners in the order returned by label_and_sort_corners.
+        dimension (int, optional): Size of the warped image. Defaults to 640.
     """
     corners_temp = np.array(corners, dtype="float32")
 
-    # Define the dimensions of the window where the new image will be displayed
-    dimension = 640  # Set this to what fits your needs, maybe 300x300 or 400x400 pixels
     margin = 0
 
     # The destination points are the points of the new image (a perfect square)
@@ -142,8 +140,64 @@ def transform_image_corners(image, corners):
         [dimension - 1 - margin, dimension - 1 - margin],
         [margin, dimension - 1 - margin]
     ], dtype="float32")
+    
+    return cv2.getPerspectiveTransform(corners_temp, dst)
+
+def source_region(M, image_shape, dimension, margin=2):
+    """Bounding rectangle of the pixels a warp to a dimension x dimension image reads.
+
+    Args:
+        M (np.ndarray): 3x3 image -> output transformation.
+        image_shape (tuple): Shape of the source image.
+        dimension (int): Size of the output image.
+        margin (int): Extra pixels around the region for the interpolation.
+
+    Returns:
+        tuple: (x0, y0, x1, y1) clipped to the image, or None if the whole image is needed
+        because the output reaches past the horizon of the source.
+    """
+    inverse = np.linalg.inv(np.asarray(M, dtype=np.float64))
+    dst = np.array([[0, 0, 1], [dimension, 0, 1], [dimension, dimension, 1], [0, dimension, 1]], dtype=np.float64)
+    src = dst @ inverse.T
+    if not (np.all(src[:, 2] > 0) or np.all(src[:, 2] < 0)):
+        return None
+    src = src[:, :2] / src[:, 2:]
+    height, width = image_shape[:2]
+    x0, y0 = np.clip(np.floor(src.min(axis=0)) - margin, 0, [width, height]).astype(int)
+    x1, y1 = np.clip(np.ceil(src.max(axis=0)) + margin + 1, 0, [width, height]).astype(int)
+    return x0, y0, x1, y1
+
+def warp_roi(image, M, dimension=640):
+    """cv2.warpPerspective to a dimension x dimension image that only touches the region it needs.
+
+    The source is cropped to the bounding rectangle of the output's footprint with a
+    NumPy view (no copy) and the transformation is shifted accordingly, so the memory
+    read scales with the size of the board in the frame instead of the frame itself.
+    The output is the same as warping the whole image, up to rounding of the interpolation.
+    """
+    region = source_region(M, image.shape, dimension)
+    if region is None:
+        return cv2.warpPerspective(image, M, (dimension, dimension))
+    x0, y0, x1, y1 = region
+    if x1 <= x0 or y1 <= y0:
+        # The output lies completely outside of the image
+        return np.zeros((dimension, dimension) + image.shape[2:], dtype=image.dtype)
+    shift = np.array([[1, 0, x0], [0, 1, y0], [0, 0, 1]], dtype=np.float64)
+    return cv2.warpPerspective(image[y0:y1, x0:x1], np.asarray(M, dtype=np.float64) @ shift, (dimension, dimension))
+
+def transform_image_corners(image, corners, return_transform=False, dimension=640):
+    """Warps the image so the (offset) board corners fill a dimension x dimension image.
+
+    Args:
+        image (np.ndarray): Original image.
+        corners (list): Corners in the order returned by label_and_sort_corners.
+        return_transform (bool, optional): Also return the transformation matrix. Defaults to False.
+        dimension (int, optional): Size of the board view. Defaults to 640.
+    """
     # Compute the perspective transform matrix and apply it
-    M = cv2.getPerspectiveTransform(corners_temp, dst)
-    warped = cv2.warpPerspective(image, M, (dimension, dimension))
+    M = get_corners_transform(corners, dimension)
+    warped = warp_roi(image, M, dimension)
 
-    return warped
\ No newline at end of file
+    if return_transform:
+        return warped, M
+    return warped
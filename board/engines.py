@@ -0,0 +1,169 @@
+import asyncio
+import queue
+import threading
+from contextlib import contextmanager
+from stockfish import Stockfish
+import chess
+import chess.engine
+
+
+class StockfishPool:
+    """Pool of Stockfish processes so concurrent requests each get their own engine.
+
+    Engines are checked out with the `engine()` context manager and returned to the pool
+    afterwards. An engine is health checked on every checkout and restarted when it has
+    crashed (Stockfish dies on some illegal positions) or raised an error while in use.
+
+    Args:
+        stockfish_path (str): Path to the Stockfish executable.
+        size (int): Number of engine processes.
+        depth (int): Search depth used by get_best_move.
+        threads (int): Number of search threads per engine.
+        movetime (int, optional): Think time in ms. If set, searches are limited by time instead of depth.
+        hash_mb (int): Size of the hash table per engine in MB.
+    """
+
+    def __init__(self, stockfish_path, size=2, depth=15, threads=1, movetime=None, hash_mb=16):
+        self.stockfish_path = stockfish_path
+        self.size = max(1, int(size))
+        self.depth = depth
+        self.threads = threads
+        self.movetime = movetime
+        self.hash_mb = hash_mb
+        self._lock = threading.Lock()
+        self._engines = []
+        self._idle = queue.Queue()
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        engine = Stockfish(self.stockfish_path, depth=self.depth,
+                           parameters={"Threads": self.threads, "Hash": self.hash_mb})
+        with self._lock:
+            self._engines.append(engine)
+        return engine
+
+    def _discard(self, engine):
+        with self._lock:
+            if engine in self._engines:
+                self._engines.remove(engine)
+        try:
+            engine.send_quit_command()
+        except Exception:
+            pass
+
+    def _restart(self, engine):
+        print("Restarting Stockfish engine")
+        self._discard(engine)
+        return self._spawn()
+
+    @staticmethod
+    def is_healthy(engine):
+        """Checks that the engine process still answers UCI commands."""
+        try:
+            engine.get_fen_position()
+            return True
+        except Exception:
+            return False
+
+    @contextmanager
+    def engine(self, timeout=None):
+        """Checks out an engine, blocking until one is available.
+
+        Raises:
+            queue.Empty: If no engine became available within `timeout` seconds.
+        """
+        engine = self._idle.get(timeout=timeout)
+        try:
+            if not self.is_healthy(engine):
+                engine = self._restart(engine)
+            yield engine
+        except Exception:
+            # The engine state is unknown after an error, start from a fresh process
+            engine = self._restart(engine)
+            raise
+        finally:
+            self._idle.put(engine)
+
+    def close(self):
+        """Stops all engine processes."""
+        with self._lock:
+            engines = list(self._engines)
+        for engine in engines:
+            self._discard(engine)
+
+
+class AsyncStockfishPool:
+    """Pool of Stockfish processes driven over non-blocking UCI pipes with python-chess.
+
+    The asyncio counterpart of StockfishPool: waiting for an engine or a search doesn't
+    hold a thread. Call `start()` from the event loop before use.
+
+    Args:
+        stockfish_path (str): Path to the Stockfish executable.
+        size (int): Number of engine processes.
+        depth (int): Search depth.
+        threads (int): Number of search threads per engine.
+        movetime (int, optional): Think time in ms. If set, searches are limited by time instead of depth.
+        hash_mb (int): Size of the hash table per engine in MB.
+    """
+
+    def __init__(self, stockfish_path, size=2, depth=15, threads=1, movetime=None, hash_mb=16):
+        self.stockfish_path = stockfish_path
+        self.size = max(1, int(size))
+        self.depth = depth
+        self.threads = threads
+        self.movetime = movetime
+        self.hash_mb = hash_mb
+        self._idle = None
+
+    async def _spawn(self):
+        _, engine = await chess.engine.popen_uci(self.stockfish_path)
+        await engine.configure({"Threads": self.threads, "Hash": self.hash_mb})
+        return engine
+
+    async def start(self):
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._spawn())
+
+    def limit(self):
+        if self.movetime:
+            return chess.engine.Limit(time=self.movetime / 1000)
+        return chess.engine.Limit(depth=self.depth)
+
+    async def best_move(self, fen):
+        """Searches the best move of a position.
+
+        Returns:
+            tuple: The (from, to) squares like moves.determine_best_move, or None.
+        """
+        board = chess.Board(fen)
+        engine = await self._idle.get()
+        try:
+            result = await engine.play(board, self.limit())
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError):
+            # Stockfish can die on illegal positions, replace it
+            try:
+                await engine.quit()
+            except Exception:
+                pass
+            engine = await self._spawn()
+            return None
+        finally:
+            self._idle.put_nowait(engine)
+        if result.move is None:
+            return None
+        move = result.move.uci()
+        return (move[:2], move[2:])
+
+    async def close(self):
+        """Stops all idle engine processes."""
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            engine = self._idle.get_nowait()
+            try:
+                await engine.quit()
+            except Exception:
+                pass
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+# Size of the rectified board view and of the grid image, see `board_dimension` in config.json
+DIMENSION = 640
+
+FILES = "ABCDEFGH"
+
+# Square index (0 = A8, 1 = B8, ..., 63 = H1) per row and column of the grid image:
+# row 0 = rank 8, col 0 = file A. Boards with white on top are flipped afterwards on
+# the FEN, see moves.correct_fen_for_black_top.
+SQUARES = np.arange(64).reshape(8, 8)
+
+
+def square_name(index):
+    """Converts a square index (0 = A8, 1 = B8, ..., 63 = H1) to its name."""
+    row, col = divmod(int(index), 8)
+    return f"{FILES[col]}{8 - row}"
+
+def square_index(name):
+    """Converts a square name, e.g. 'E4', to its index (0 = A8, 1 = B8, ..., 63 = H1)."""
+    return (8 - int(name[1])) * 8 + FILES.index(name[0].upper())
+
+def square_size(dimension=DIMENSION):
+    """Side of one square in pixels on a dimension x dimension grid image."""
+    return dimension / 8
+
+def squares_at(x, y, dimension=DIMENSION):
+    """Square index of every point on the grid image, computed instead of searched.
+
+    Points on the outer edge of the board belong to the last row or column, points
+    on an edge between two squares to the square to the right or below.
+
+    Args:
+        x (np.ndarray): X coordinates on the grid image.
+        y (np.ndarray): Y coordinates on the grid image.
+        dimension (int): Size of the square grid image.
+
+    Returns:
+        np.ndarray: Square index per point, -1 for points off the board.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    size = square_size(dimension)
+    on_board = (x >= 0) & (x <= dimension) & (y >= 0) & (y <= dimension)
+    cols = np.clip(np.where(on_board, x // size, 0), 0, 7).astype(int)
+    rows = np.clip(np.where(on_board, y // size, 0), 0, 7).astype(int)
+    return np.where(on_board, SQUARES[rows, cols], -1)
+
+def square_at(x, y, dimension=DIMENSION):
+    """squares_at for a single point without the array overhead, -1 off the board."""
+    if not (0 <= x <= dimension and 0 <= y <= dimension):
+        return -1
+    size = square_size(dimension)
+    return min(int(y // size), 7) * 8 + min(int(x // size), 7)
+
+def square_bounds(index, dimension=DIMENSION):
+    """Pixel rectangle of a square on the grid image.
+
+    Returns:
+        list: Top-left and bottom-right corner, [(x1, y1), (x2, y2)].
+    """
+    row, col = divmod(int(index), 8)
+    size = square_size(dimension)
+    return [(col * size, row * size), ((col + 1) * size, (row + 1) * size)]
+
+def square_coordinates(dimension=DIMENSION):
+    """Square name -> pixel rectangle of every square, ordered A8, B8, ..., H1."""
+    return {square_name(index): square_bounds(index, dimension) for index in range(64)}
@@ -1,6 +1,7 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
+from board.corners import warp_roi
+from board.geometry import DIMENSION, square_at, square_coordinates
 
 def predict_grid_segmentation(model, image_path, conf=0.1, iou=0.2):
     
@@ -50,10 +51,9 @@ def get_corners_from_grid_segmentation(prediction_result):
     
     return sorted_corners
 
-def make_perspective_transform(image, corners):
+def get_perspective_transform(corners, dimension=DIMENSION):
     
     corners = np.array(corners, dtype="float32")
-    dimension = 640
     
     dst = np.array([
         [0, 0],
@@ -62,11 +62,33 @@ def make_perspective_transform(image, corners):
         [0, dimension - 1]
     ], dtype="float32")
     
-    M = cv2.getPerspectiveTransform(corners, dst)
+    return cv2.getPerspectiveTransform(corners, dst)
+
+def make_perspective_transform(image, corners, dimension=DIMENSION):
+    
+    M = get_perspective_transform(corners, dimension)
     warped = cv2.warpPerspective(image, M, (dimension, dimension))
     
     return warped, M
 
+def compose_transforms(grid_transform, corners_transform):
+    """Composes the grid and corner transformations into one image -> grid transformation."""
+    M = np.asarray(grid_transform, dtype=np.float64) @ np.asarray(corners_transform, dtype=np.float64)
+    return M / M[2, 2]
+
+def warp_to_grid(image, grid_transform, corners_transform, dimension=DIMENSION):
+    """Warps the original image straight onto the grid with a single warp.
+
+    Equivalent to make_perspective_transform applied to the output of
+    corners.transform_image_corners, without the intermediate resampling.
+
+    Returns:
+        tuple: The warped grid image and the composed transformation matrix.
+    """
+    M = compose_transforms(grid_transform, corners_transform)
+    warped = warp_roi(image, M, dimension)
+    return warped, M
+
 def correct_orientation(image):
     img_hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
     h, w = img_hsv.shape[:2]
@@ -113,7 +135,7 @@ def correct_orientation_advanced(image):
     img_lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
     
     h, w = img_lab.shape[:2]
-    outer_size = 640 // 8
+    outer_size = w // 8
     border_width = 10
     num_samples = 10
     
@@ -176,75 +198,22 @@ def correct_orientation_advanced(image):
     
 def map_grid_to_coordinates(image):
     
-    h, w = image.shape[:2]
-    grid_size = 8
-    square_width = w // grid_size
-    square_height = h // grid_size
-    
-    grid_coordinates = {}
-    # labels --> [A8, B8, C8, D8, E8, F8, G8, H8, A7, B7, C7, D7, E7, F7, G7, H7, ...]
-    labels = [f"{chr(65 + col)}{8 - row}" for row in range(grid_size) for col in range(grid_size)]  
-    idx = 0
-    
-    for row in range(grid_size):
-        for col in range(grid_size):
-            x1 = col * square_width
-            y1 = row * square_height
-            x2 = x1 + square_width
-            y2 = y1 + square_height
-            grid_coordinates[labels[idx]] = [(x1, y1), (x2, y2)]
-            idx += 1
-    
-    return grid_coordinates
-
-grid_coords = {
-    'A8': [(0, 0), (80, 80)], 'B8': [(80, 0), (160, 80)], 'C8': [(160, 0), (240, 80)], 'D8': [(240, 0), (320, 80)],
-    'E8': [(320, 0), (400, 80)], 'F8': [(400, 0), (480, 80)], 'G8': [(480, 0), (560, 80)], 'H8': [(560, 0), (640, 80)],
-    'A7': [(0, 80), (80, 160)], 'B7': [(80, 80), (160, 160)], 'C7': [(160, 80), (240, 160)], 'D7': [(240, 80), (320, 160)],
-    'E7': [(320, 80), (400, 160)], 'F7': [(400, 80), (480, 160)], 'G7': [(480, 80), (560, 160)], 'H7': [(560, 80), (640, 160)],
-    'A6': [(0, 160), (80, 240)], 'B6': [(80, 160), (160, 240)], 'C6': [(160, 160), (240, 240)], 'D6': [(240, 160), (320, 240)],
-    'E6': [(320, 160), (400, 240)], 'F6': [(400, 160), (480, 240)], 'G6': [(480, 160), (560, 240)], 'H6': [(560, 160), (640, 240)],
-    'A5': [(0, 240), (80, 320)], 'B5': [(80, 240), (160, 320)], 'C5': [(160, 240), (240, 320)], 'D5': [(240, 240), (320, 320)],
-    'E5': [(320, 240), (400, 320)], 'F5': [(400, 240), (480, 320)], 'G5': [(480, 240), (560, 320)], 'H5': [(560, 240), (640, 320)],
-    'A4': [(0, 320), (80, 400)], 'B4': [(80, 320), (160, 400)], 'C4': [(160, 320), (240, 400)], 'D4': [(240, 320), (320, 400)],
-    'E4': [(320, 320), (400, 400)], 'F4': [(400, 320), (480, 400)], 'G4': [(480, 320), (560, 400)], 'H4': [(560, 320), (640, 400)],
-    'A3': [(0, 400), (80, 480)], 'B3': [(80, 400), (160, 480)], 'C3': [(160, 400), (240, 480)], 'D3': [(240, 400), (320, 480)],
-    'E3': [(320, 400), (400, 480)], 'F3': [(400, 400), (480, 480)], 'G3': [(480, 400), (560, 480)], 'H3': [(560, 400), (640, 480)],
-    'A2': [(0, 480), (80, 560)], 'B2': [(80, 480), (160, 560)], 'C2': [(160, 480), (240, 560)], 'D2': [(240, 480), (320, 560)],
-    'E2': [(320, 480), (400, 560)], 'F2': [(400, 480), (480, 560)], 'G2': [(480, 480), (560, 560)], 'H2': [(560, 480), (640, 560)],
-    'A1': [(0, 560), (80, 640)], 'B1': [(80, 560), (160, 640)], 'C1': [(160, 560), (240, 640)], 'D1': [(240, 560), (320, 640)],
-    'E1': [(320, 560), (400, 640)], 'F1': [(400, 560), (480, 640)], 'G1': [(480, 560), (560, 640)], 'H1': [(560, 560), (640, 640)]
-}
+    # {'A8': [(x1, y1), (x2, y2)], 'B8': ..., 'H1': ...}
+    return square_coordinates(image.shape[1])
 
-
-def place_pieces_on_board(board, pieces, grid_coords=grid_coords):
+def place_pieces_on_board(board, pieces, dimension=DIMENSION):
     """
     Place each detected piece on the board based on their coordinates.
 
     :param board: 2D list representing the chessboard
     :param pieces: List of tuples containing piece center coordinates and piece type [(x, y), 'piece']
-    :param grid_coords: Dictionary mapping square names to their coordinate ranges
+    :param dimension: Size of the square grid image the coordinates are on
     """
     
-    def find_square(x, y, grid_coords):
-        """
-        Find the corresponding square for the given coordinates.
-
-        :param x: X coordinate
-        :param y: Y coordinate
-        :param grid_coords: Dictionary mapping square names to their coordinate ranges
-        :return: Square name (e.g., 'A8') if found, else None
-        """
-        for square, ((x1, y1), (x2, y2)) in grid_coords.items():
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                return square
-        return None
-    
     for (x, y), piece in pieces:
-        square = find_square(x, y, grid_coords)
-        if square:
-            row = 8 - int(square[1])  # Convert rank to row index (0-7)
-            col = ord(square[0]) - ord('A')  # Convert file to column index (0-7)
+        square = square_at(x, y, dimension)
+        if square >= 0:
+            row, col = divmod(square, 8)  # Row 0 = rank 8, col 0 = file A
             board[row][col] = piece
     
 def generate_fen(board):
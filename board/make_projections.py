@@ -10,6 +10,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 import corners as corners
+from geometry import DIMENSION
 
 import warnings
 warnings.filterwarnings("ignore")
@@ -38,7 +39,7 @@ def make_projection(img_dir, projections_dir):
             image = cv2.imread(image_path)
             corners1 = np.array(sorted_corners, dtype="float32")
             
-            dimension = 640
+            dimension = DIMENSION
             dst = np.array([
                 [0, 0],
                 [dimension - 1, 0],
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds in seconds, from a fast warp up to a slow Stockfish search
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def worker_labels(labelnames, key):
+    """Prepends the worker (process id) label, so the series of the serve.py workers can be summed."""
+    return ('worker',) + labelnames, (str(os.getpid()),) + key
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labelnames, values)) + '}'
+
+class Counter:
+    """Thread-safe counter per label value, rendered in the Prometheus text format.
+
+    Args:
+        name (str): Metric name.
+        help (str): Description shown by Prometheus.
+        labelnames (tuple): Names of the labels passed to `inc`.
+    """
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(*worker_labels(self.labelnames, key))} {value}')
+        return lines
+
+class Histogram:
+    """Thread-safe histogram per label value, rendered in the Prometheus text format.
+
+    Args:
+        name (str): Metric name.
+        help (str): Description shown by Prometheus.
+        labelnames (tuple): Names of the labels passed to `observe`.
+        buckets (tuple): Sorted upper bounds of the buckets, +Inf is added automatically.
+    """
+
+    def __init__(self, name, help, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            # Per label value: cumulative bucket counts, sum and count
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                labelnames, key = worker_labels(self.labelnames, key)
+                bucket_labels = labelnames + ('le',)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{format_labels(bucket_labels, key + (repr(bound),))} {bucket_count}')
+                lines.append(f'{self.name}_bucket{format_labels(bucket_labels, key + ("+Inf",))} {count}')
+                lines.append(f'{self.name}_sum{format_labels(labelnames, key)} {total}')
+                lines.append(f'{self.name}_count{format_labels(labelnames, key)} {count}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('chessvision_stage_seconds', 'Time spent per pipeline stage. Model stages are timed per batch.', ['stage'])
+FAILURES = Counter('chessvision_failures_total', 'Requests or boards that failed, per failure mode.', ['reason'])
+CACHE_HITS = Counter('chessvision_cache_hits_total', 'Lookups answered from a cache.', ['cache'])
+CACHE_MISSES = Counter('chessvision_cache_misses_total', 'Lookups a cache could not answer.', ['cache'])
+REGISTRY = [STAGE_SECONDS, FAILURES, CACHE_HITS, CACHE_MISSES]
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_recordings = []
+
+
+@contextmanager
+def timer(stage):
+    """Observes the duration of the wrapped block in the stage histogram.
+
+    Example:
+        with metrics.timer('corner_warp'):
+            ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        for samples in _recordings:
+            samples.setdefault(stage, []).append(elapsed)
+
+@contextmanager
+def recording():
+    """Collects the raw durations of every stage timed inside the block.
+
+    The histograms only keep bucket counts, benchmark.py uses this to compute exact
+    percentiles.
+
+    Yields:
+        dict: Stage name -> list of durations in seconds, filled while the block runs.
+    """
+    samples = {}
+    _recordings.append(samples)
+    try:
+        yield samples
+    finally:
+        _recordings.remove(samples)
+
+def failure(reason):
+    """Counts one failure of the given mode, e.g. 'no_corners'."""
+    FAILURES.inc(reason=reason)
+
+def reset():
+    """Clears every metric, e.g. in a forked worker so it doesn't repeat the parent's values."""
+    for metric in REGISTRY:
+        metric.reset()
+
+def render():
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -51,10 +51,21 @@ def is_valid_fen(fen):
     return re.match(r'^[rnbqkpRNBQKP1-8]+\/[rnbqkpRNBQKP1-8]+\/[rnbqkpRNBQKP1-8]+\/[rnbqkpRNBQKP1-8]+\/[rnbqkpRNBQKP1-8]+\/[rnbqkpRNBQKP1-8]+\/[rnbqkpRNBQKP1-8]+\/[rnbqkpRNBQKP1-8]+ [bw] [KQkq-]+ [a-h1-8-]* \d+ \d+$', fen) is not None
 
 
-def determine_best_move(fen, stockfish):
+def is_legal_position(fen):
+    """Whether python-chess accepts the position: one king per side, no pawns on the back
+    ranks, the side not to move isn't in check, ..."""
+    try:
+        return chess.Board(fen).is_valid()
+    except ValueError:
+        return False
+
+def determine_best_move(fen, stockfish, movetime=None):
     if is_valid_fen(fen):
         stockfish.set_fen_position(fen)
-        best_move = stockfish.get_best_move()
+        if movetime:
+            best_move = stockfish.get_best_move_time(movetime)
+        else:
+            best_move = stockfish.get_best_move()
         if best_move:
             best_move_from = best_move[:2]
             best_move_to = best_move[2:]
@@ -120,26 +131,33 @@ def mirror_fen(fen):
 #     else:
 #         return None
 
-def output_board_best_move(fen, stockfish, white_or_black_top='black'):
-    move = determine_best_move(fen, stockfish)
-    if move:
-        board = chess.Board(fen)
-        # Set the orientation based on the parameter passed
-        if white_or_black_top == 'white':
-            board.turn = chess.WHITE
-        else:
-            board.turn = chess.BLACK
-            
-        move_from = chess.parse_square(move[0])
-        move_to = chess.parse_square(move[1])
-        arrows = [chess.svg.Arrow(move_from, move_to, color="#0000cccc")]
-        
-        # Generate the SVG with the specified orientation
-        svg = chess.svg.board(board=board, arrows=arrows, size=350, orientation=chess.WHITE if white_or_black_top == 'black' else chess.BLACK)
-        return SVG(svg)
+def render_best_move(fen, move, white_or_black_top='black'):
+    board = chess.Board(fen)
+    # Set the orientation based on the parameter passed
+    if white_or_black_top == 'white':
+        board.turn = chess.WHITE
     else:
-        return None
+        board.turn = chess.BLACK
+        
+    move_from = chess.parse_square(move[0])
+    move_to = chess.parse_square(move[1])
+    arrows = [chess.svg.Arrow(move_from, move_to, color="#0000cccc")]
     
+    # Generate the SVG with the specified orientation
+    svg = chess.svg.board(board=board, arrows=arrows, size=350, orientation=chess.WHITE if white_or_black_top == 'black' else chess.BLACK)
+    return SVG(svg)
 
+def output_board_best_move(fen, stockfish, white_or_black_top='black', movetime=None):
+    move = determine_best_move(fen, stockfish, movetime)
+    if move:
+        return render_best_move(fen, move, white_or_black_top)
+    else:
+        return None
 
+def normalize_fen(fen):
+    """Returns the part of the FEN that determines the best move: placement, side to move,
+    castling rights and en passant square. The move counters are dropped."""
+    return ' '.join(fen.split(' ')[:4])
 
+def best_move_cache_key(fen, white_or_black_top, depth=None, movetime=None):
+    return (normalize_fen(fen), white_or_black_top, depth, movetime)
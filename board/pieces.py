@@ -1,26 +1,8 @@
 import numpy as np
 import cv2
 import random
-from ultralytics import YOLO
-
-grid_coords = {
-    'A8': [(0, 0), (80, 80)], 'B8': [(80, 0), (160, 80)], 'C8': [(160, 0), (240, 80)], 'D8': [(240, 0), (320, 80)],
-    'E8': [(320, 0), (400, 80)], 'F8': [(400, 0), (480, 80)], 'G8': [(480, 0), (560, 80)], 'H8': [(560, 0), (640, 80)],
-    'A7': [(0, 80), (80, 160)], 'B7': [(80, 80), (160, 160)], 'C7': [(160, 80), (240, 160)], 'D7': [(240, 80), (320, 160)],
-    'E7': [(320, 80), (400, 160)], 'F7': [(400, 80), (480, 160)], 'G7': [(480, 80), (560, 160)], 'H7': [(560, 80), (640, 160)],
-    'A6': [(0, 160), (80, 240)], 'B6': [(80, 160), (160, 240)], 'C6': [(160, 160), (240, 240)], 'D6': [(240, 160), (320, 240)],
-    'E6': [(320, 160), (400, 240)], 'F6': [(400, 160), (480, 240)], 'G6': [(480, 160), (560, 240)], 'H6': [(560, 160), (640, 240)],
-    'A5': [(0, 240), (80, 320)], 'B5': [(80, 240), (160, 320)], 'C5': [(160, 240), (240, 320)], 'D5': [(240, 240), (320, 320)],
-    'E5': [(320, 240), (400, 320)], 'F5': [(400, 240), (480, 320)], 'G5': [(480, 240), (560, 320)], 'H5': [(560, 240), (640, 320)],
-    'A4': [(0, 320), (80, 400)], 'B4': [(80, 320), (160, 400)], 'C4': [(160, 320), (240, 400)], 'D4': [(240, 320), (320, 400)],
-    'E4': [(320, 320), (400, 400)], 'F4': [(400, 320), (480, 400)], 'G4': [(480, 320), (560, 400)], 'H4': [(560, 320), (640, 400)],
-    'A3': [(0, 400), (80, 480)], 'B3': [(80, 400), (160, 480)], 'C3': [(160, 400), (240, 480)], 'D3': [(240, 400), (320, 480)],
-    'E3': [(320, 400), (400, 480)], 'F3': [(400, 400), (480, 480)], 'G3': [(480, 400), (560, 480)], 'H3': [(560, 400), (640, 480)],
-    'A2': [(0, 480), (80, 560)], 'B2': [(80, 480), (160, 560)], 'C2': [(160, 480), (240, 560)], 'D2': [(240, 480), (320, 560)],
-    'E2': [(320, 480), (400, 560)], 'F2': [(400, 480), (480, 560)], 'G2': [(480, 480), (560, 560)], 'H2': [(560, 480), (640, 560)],
-    'A1': [(0, 560), (80, 640)], 'B1': [(80, 560), (160, 640)], 'C1': [(160, 560), (240, 640)], 'D1': [(240, 560), (320, 640)],
-    'E1': [(320, 560), (400, 640)], 'F1': [(400, 560), (480, 640)], 'G1': [(480, 560), (560, 640)], 'H1': [(560, 560), (640, 640)]
-}
+import heapq
+from board.geometry import DIMENSION, SQUARES, square_name, square_size, squares_at
 
 predefined_labels = ["b", "k", "n", "p", "q", "r", "B", "K", "N", "P", "Q", "R"]
 
@@ -41,6 +23,12 @@ def extract_boxes_labels(results):
     labels = results[0].boxes.cls.cpu().numpy()
     return boxes, labels
 
+def extract_boxes_labels_confidences(results):
+    """extract_boxes_labels that also returns the confidence of every detection."""
+    boxes, labels = extract_boxes_labels(results)
+    confidences = results[0].boxes.conf.cpu().numpy()
+    return boxes, labels, confidences
+
 def xyhw_to_xyxy(box):
     """
     Somehow x and y in xywh are the center of the box (normally top left?)
@@ -90,31 +78,401 @@ def transform_coordinates(points, M):
     
     return transformed_points
 
-def map_points_to_grid(points, grid=grid_coords):
-    square_counts = {square: 0 for square in grid.keys()}
-    
-    for point in points:
-        x, y = point
-        for square, ((x1, y1), (x2, y2)) in grid.items():
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                square_counts[square] += 1
-                break
+def map_points_to_grid(points, dimension=DIMENSION):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    squares = squares_at(points[:, 0], points[:, 1], dimension)
+    square_counts = np.bincount(squares[squares >= 0], minlength=64)
     
     # Find square with most points
-    max_square = max(square_counts, key=square_counts.get)
-    return max_square if square_counts[max_square] > 0 else None
+    max_square = np.argmax(square_counts)
+    return square_name(max_square) if square_counts[max_square] > 0 else None
 
-def get_mapped_pieces(sampled_points_labels, M):
+def get_mapped_pieces(sampled_points_labels, M, dimension=DIMENSION):
     mapped_pieces = []
     
     for points, label in sampled_points_labels:
         transformed_points = transform_coordinates(points, M)
-        mapped_square = map_points_to_grid(transformed_points)
+        mapped_square = map_points_to_grid(transformed_points, dimension)
         if mapped_square:
             mapped_pieces.append((mapped_square, label))
     
     return mapped_pieces
 
+def sample_points_from_boxes(boxes, num_points=10, threshold=0.2):
+    """Vectorized sample_points_from_bbox for all boxes at once.
+
+    Args:
+        boxes (np.ndarray): Nx4 array of boxes in xywh format (x, y is the center).
+        num_points (int): Number of points sampled per box.
+        threshold (float): Fraction of the box height, counted from the bottom, to sample from.
+
+    Returns:
+        np.ndarray: N x num_points x 2 array of sampled (x, y) points.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x, y, w, h = boxes.T
+    x1 = x - w / 2
+    y2 = y + h / 2
+    strip = h * threshold
+    
+    uniform = np.random.uniform(size=(len(boxes), num_points, 2))
+    xs = x1[:, None] + uniform[..., 0] * w[:, None]
+    ys = (y2 - strip)[:, None] + uniform[..., 1] * strip[:, None]
+    return np.stack([xs, ys], axis=-1)
+
+def map_boxes_to_squares(points, M, dimension=DIMENSION, return_share=False):
+    """Transforms all sampled points with M and lets them vote for a square per box.
+
+    Args:
+        points (np.ndarray): N x P x 2 array of sampled points in image coordinates.
+        M (np.ndarray): 3x3 perspective transformation to the grid.
+        dimension (int): Size of the square grid image the transformation maps to.
+        return_share (bool): Also return the share of the points that voted for the square.
+
+    Returns:
+        np.ndarray: Square index (0 = A8, ..., 63 = H1) per box, -1 if no point landed on the board.
+    """
+    n_boxes, n_points = points.shape[:2]
+    if n_boxes == 0 or n_points == 0:
+        squares = np.full(n_boxes, -1, dtype=int)
+        return (squares, np.zeros(n_boxes)) if return_share else squares
+    
+    transformed = cv2.perspectiveTransform(points.reshape(-1, 1, 2).astype(np.float32), np.asarray(M, dtype=np.float64))
+    transformed = transformed.reshape(n_boxes, n_points, 2)
+    
+    squares = squares_at(transformed[..., 0], transformed[..., 1], dimension)
+    # Points off the board vote for a 65th dummy square
+    squares[squares < 0] = 64
+    
+    offsets = np.arange(n_boxes)[:, None] * 65
+    votes = np.bincount((squares + offsets).ravel(), minlength=n_boxes * 65).reshape(n_boxes, 65)[:, :64]
+    best = np.argmax(votes, axis=1)
+    best_votes = votes[np.arange(n_boxes), best]
+    best[best_votes == 0] = -1
+    if return_share:
+        return best, best_votes / n_points
+    return best
+
+def get_mapped_pieces_vectorized(boxes, labels, M, num_points=10, dimension=DIMENSION):
+    """Vectorized equivalent of get_sampled_points followed by get_mapped_pieces.
+
+    Returns:
+        list: (square, label) tuples, e.g. ('E4', 'P').
+    """
+    points = sample_points_from_boxes(boxes, num_points)
+    squares = map_boxes_to_squares(points, M, dimension)
+    
+    mapped_pieces = []
+    for square, label in zip(squares, labels):
+        if square >= 0:
+            mapped_pieces.append((square_name(square), predefined_labels[int(label)]))
+    
+    return mapped_pieces
+
+def bottom_strip_polygons(boxes, threshold=0.2):
+    """Returns the bottom 'threshold' % strip of every box as an N x 4 x 2 polygon array."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x, y, w, h = boxes.T
+    x1 = x - w / 2
+    x2 = x + w / 2
+    y2 = y + h / 2
+    y_min = y2 - h * threshold
+    return np.stack([
+        np.stack([x1, y_min], axis=-1),
+        np.stack([x2, y_min], axis=-1),
+        np.stack([x2, y2], axis=-1),
+        np.stack([x1, y2], axis=-1)
+    ], axis=1)
+
+def map_polygon_to_square(polygon, dimension=DIMENSION, return_share=False):
+    """Finds the square with the largest exact area overlap with a convex polygon.
+
+    Args:
+        polygon (np.ndarray): 4x2 polygon in grid coordinates.
+        dimension (int): Size of the square grid image.
+        return_share (bool): Also return the share of the polygon area inside that square.
+
+    Returns:
+        int: Square index (0 = A8, ..., 63 = H1), -1 if the polygon doesn't overlap the board.
+    """
+    size = square_size(dimension)
+    polygon = np.ascontiguousarray(polygon, dtype=np.float32)
+    
+    # Only the squares under the bounding box of the polygon can overlap it
+    x_min, y_min = np.clip(polygon.min(axis=0), 0, dimension)
+    x_max, y_max = np.clip(polygon.max(axis=0), 0, dimension)
+    col_start, col_end = int(min(x_min // size, 7)), int(min(x_max // size, 7))
+    row_start, row_end = int(min(y_min // size, 7)), int(min(y_max // size, 7))
+    
+    best_square, best_area = -1, 0.0
+    for row in range(row_start, row_end + 1):
+        for col in range(col_start, col_end + 1):
+            x1, y1 = col * size, row * size
+            square = np.array([
+                [x1, y1],
+                [x1 + size, y1],
+                [x1 + size, y1 + size],
+                [x1, y1 + size]
+            ], dtype=np.float32)
+            area, _ = cv2.intersectConvexConvex(polygon, square)
+            if area > best_area:
+                best_square, best_area = int(SQUARES[row, col]), area
+    
+    if return_share:
+        polygon_area = cv2.contourArea(polygon)
+        return best_square, best_area / polygon_area if polygon_area > 0 else 0.0
+    return best_square
+
+def get_mapped_pieces_analytic(boxes, labels, M, threshold=0.2, dimension=DIMENSION):
+    """Deterministic alternative to point sampling.
+
+    The bottom strip of each box is projected through M and the piece is assigned to
+    the square it overlaps the most, so the result doesn't depend on random samples.
+
+    Returns:
+        list: (square, label) tuples, e.g. ('E4', 'P').
+    """
+    polygons = bottom_strip_polygons(boxes, threshold)
+    if len(polygons) == 0:
+        return []
+    projected = cv2.perspectiveTransform(polygons.reshape(-1, 1, 2), np.asarray(M, dtype=np.float64))
+    projected = projected.reshape(-1, 4, 2)
+    
+    mapped_pieces = []
+    for polygon, label in zip(projected, labels):
+        square = map_polygon_to_square(polygon, dimension)
+        if square >= 0:
+            mapped_pieces.append((square_name(square), predefined_labels[int(label)]))
+    
+    return mapped_pieces
+
+def map_boxes_with_share(boxes, M, num_points=10, threshold=0.2, dimension=DIMENSION):
+    """Square of every box and how sure the mapping is.
+
+    Args:
+        boxes (np.ndarray): Nx4 array of boxes in xywh format.
+        M (np.ndarray): 3x3 perspective transformation to the grid.
+        num_points (int or str): Points sampled per box, or 'analytic' for the exact footprint overlap.
+        dimension (int): Size of the square grid image the transformation maps to.
+
+    Returns:
+        tuple: Square index per box (-1 if off the board) and the share of the sampled
+        points or of the footprint area that fell on that square.
+    """
+    if num_points == 'analytic':
+        polygons = bottom_strip_polygons(boxes, threshold)
+        if len(polygons) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        projected = cv2.perspectiveTransform(polygons.reshape(-1, 1, 2), np.asarray(M, dtype=np.float64))
+        mapped = [map_polygon_to_square(polygon, dimension, return_share=True) for polygon in projected.reshape(-1, 4, 2)]
+        squares, shares = zip(*mapped)
+        return np.array(squares, dtype=int), np.array(shares, dtype=np.float64)
+    points = sample_points_from_boxes(boxes, num_points, threshold)
+    return map_boxes_to_squares(points, M, dimension, return_share=True)
+
+def piece_scores(squares, labels, confidences, shares=None):
+    """Accumulates the detections in a fixed size 8x8x12 score tensor.
+
+    Every detection adds its confidence, weighted by the share of the box that fell on
+    its square, to score[row, col, label]. Duplicate detections of the same piece add
+    up, detections of different pieces on one square compete.
+
+    Args:
+        squares (np.ndarray): Square index per detection, -1 for detections off the board.
+        labels (np.ndarray): Class index per detection (see predefined_labels).
+        confidences (np.ndarray): Detection confidences.
+        shares (np.ndarray, optional): Mapping certainty per detection, 1 if not given.
+
+    Returns:
+        np.ndarray: 8x8x12 scores, row 0 is rank 8.
+    """
+    squares = np.asarray(squares, dtype=int)
+    weights = np.asarray(confidences, dtype=np.float64)
+    if shares is not None:
+        weights = weights * np.asarray(shares, dtype=np.float64)
+    valid = squares >= 0
+    scores = np.zeros((8, 8, len(predefined_labels)))
+    rows, cols = np.divmod(squares[valid], 8)
+    np.add.at(scores, (rows, cols, np.asarray(labels, dtype=int)[valid]), weights[valid])
+    return scores
+
+PAWNS = [predefined_labels.index('p'), predefined_labels.index('P')]
+# Smallest probability a square keeps of being empty, however strong its detections
+MIN_EMPTY = 0.01
+# Maximum number of each piece a legal position can have
+PIECE_LIMITS = [(predefined_labels.index('k'), 1), (predefined_labels.index('K'), 1),
+                (predefined_labels.index('p'), 8), (predefined_labels.index('P'), 8)]
+
+def resolve_scores(scores):
+    """Picks at most one piece per square from a score tensor, respecting chess constraints.
+
+    Each square gets its highest scoring piece. Pawns are never placed on the first or
+    last rank, and when there are more kings or pawns of a color than a position can
+    have, the weakest ones fall back to the next best piece of their square (or empty).
+
+    Args:
+        scores (np.ndarray): 8x8x12 tensor from piece_scores.
+
+    Returns:
+        np.ndarray: 8x8 class indices, -1 for empty squares.
+    """
+    scores = np.array(scores, dtype=np.float64).reshape(64, -1)
+    edge_squares = np.r_[0:8, 56:64]
+    scores[np.ix_(edge_squares, PAWNS)] = 0
+    
+    # Every round removes at least one candidate, so this ends after a few rounds
+    while True:
+        best = scores.max(axis=1)
+        board = np.where(best > 0, scores.argmax(axis=1), -1)
+        changed = False
+        for label, limit in PIECE_LIMITS:
+            squares = np.flatnonzero(board == label)
+            if len(squares) > limit:
+                weakest = squares[np.argsort(-best[squares], kind='stable')[limit:]]
+                scores[weakest, label] = 0
+                changed = True
+        if not changed:
+            return board.reshape(8, 8)
+
+def board_to_mapped_pieces(board):
+    """Converts an 8x8 array of class indices (-1 empty) to (square, label) tuples."""
+    return [(square_name(square), predefined_labels[label])
+            for square, label in enumerate(np.asarray(board).ravel()) if label >= 0]
+
+def get_mapped_pieces_resolved(boxes, labels, confidences, M, num_points=10, dimension=DIMENSION):
+    """Confidence-aware alternative to get_mapped_pieces_vectorized and get_mapped_pieces_analytic.
+
+    Instead of letting the last detection on a square win, conflicts are resolved by
+    score and the chess constraints of resolve_scores are enforced.
+
+    Returns:
+        list: (square, label) tuples, e.g. ('E4', 'P').
+    """
+    squares, shares = map_boxes_with_share(boxes, M, num_points, dimension=dimension)
+    scores = piece_scores(squares, labels, confidences, shares)
+    return board_to_mapped_pieces(resolve_scores(scores))
+
+def square_probabilities(scores):
+    """Turns a score tensor into a probability per square of every piece and of the square being empty.
+
+    The highest score of a square is the probability that it holds a piece, which is
+    divided over the pieces in proportion to their scores. Duplicate or overlapping
+    boxes add up to more than 1, so the probability of a piece is capped at 1 - MIN_EMPTY
+    and every detected piece can still turn out to be wrong. Pawns on the first and last
+    rank get no probability.
+
+    Args:
+        scores (np.ndarray): 8x8x12 tensor from piece_scores.
+
+    Returns:
+        np.ndarray: 64x13 probabilities, column 12 is empty.
+    """
+    scores = np.array(scores, dtype=np.float64).reshape(64, -1)
+    scores[np.ix_(np.r_[0:8, 56:64], PAWNS)] = 0
+    total = scores.sum(axis=1, keepdims=True)
+    occupied = np.minimum(scores.max(axis=1, keepdims=True), 1.0 - MIN_EMPTY)
+    pieces_probability = np.divide(scores, total, out=np.zeros_like(scores), where=total > 0) * occupied
+    return np.hstack([pieces_probability, 1.0 - occupied])
+
+def top_k_boards(scores, k=32, max_options=3):
+    """The k most probable boards within the piece limits, found with a beam search.
+
+    Squares are visited in order and a board that gets more kings or pawns of a color
+    than PIECE_LIMITS allows is dropped right away, the same constraints resolve_scores
+    enforces. Partial boards are ranked by their probability when the remaining squares
+    take their most probable option; without the limits this keeps the exact k best
+    boards, with them it is a close approximation. Only the `max_options` most probable
+    options of a square are considered.
+
+    Returns:
+        list: (board, probability) tuples, most probable first. Boards are 8x8 class
+        indices with -1 for empty squares.
+    """
+    probabilities = square_probabilities(scores)
+    empty = probabilities.shape[1] - 1
+    options = np.argsort(-probabilities, axis=1, kind='stable')[:, :max_options]
+    
+    limit_index = {label: i for i, (label, _) in enumerate(PIECE_LIMITS)}
+    limits = [limit for _, limit in PIECE_LIMITS]
+    
+    def place(counts, option):
+        """Counts of the limited pieces after placing `option`, None if that breaks a limit."""
+        i = limit_index.get(int(option))
+        if i is None:
+            return counts
+        if counts[i] >= limits[i]:
+            return None
+        return counts[:i] + (counts[i] + 1,) + counts[i + 1:]
+    
+    base = options[:, 0].copy()
+    log_probability = np.log(probabilities[np.arange(64), base]).sum()
+    beams = [(log_probability, [], (0,) * len(limits))]
+    for square in range(64):
+        best_option = options[square, 0]
+        alternatives = [option for option in options[square, 1:] if probabilities[square, option] > 0]
+        if not alternatives and int(best_option) not in limit_index:
+            continue
+        extended = []
+        for log_p, swaps, counts in beams:
+            placed = place(counts, best_option)
+            if placed is not None:
+                extended.append((log_p, swaps, placed))
+            for option in alternatives:
+                placed = place(counts, option)
+                if placed is None:
+                    continue
+                # Change relative to the most probable option of the square
+                change = np.log(probabilities[square, option]) - np.log(probabilities[square, best_option])
+                extended.append((log_p + change, swaps + [(square, option)], placed))
+        beams = heapq.nlargest(k, extended, key=lambda beam: beam[0])
+    
+    boards = []
+    for log_p, swaps, _ in beams:
+        board = base.copy()
+        for square, option in swaps:
+            board[square] = option
+        board[board == empty] = -1
+        boards.append((board.reshape(8, 8), float(np.exp(log_p))))
+    return boards
+
+def board_confidence(scores, board):
+    """How sure the detections are of a board: the probability of its least certain square.
+
+    Unlike the probability of the whole board this doesn't shrink with the number of
+    pieces, a start position and a lone pair of kings detected with the same confidence
+    get the same value. It is low as soon as one square is in doubt, e.g. when two
+    different pieces were detected on it or a piece was dropped by the legality search.
+
+    Args:
+        scores (np.ndarray): 8x8x12 tensor from piece_scores.
+        board (np.ndarray): 8x8 class indices, -1 for empty squares.
+
+    Returns:
+        float: Between 0 and 1.
+    """
+    probabilities = square_probabilities(scores)
+    choices = np.asarray(board).ravel()
+    choices = np.where(choices < 0, probabilities.shape[1] - 1, choices)
+    return float(probabilities[np.arange(64), choices].min())
+
+def decode_legal_board(scores, is_legal, k=32):
+    """Finds the most probable board among the top k that passes a legality check.
+
+    Args:
+        scores (np.ndarray): 8x8x12 tensor from piece_scores.
+        is_legal (callable): Takes a FEN piece placement and returns whether the position is legal.
+        k (int): Number of boards to try.
+
+    Returns:
+        tuple: The FEN piece placement and its confidence (see board_confidence), or None
+        if none of the k boards is legal.
+    """
+    for board, _ in top_k_boards(scores, k):
+        placement = create_FEN_notation(board_to_mapped_pieces(board))
+        if is_legal(placement):
+            return placement, board_confidence(scores, board)
+    return None
+
 def create_FEN_notation(mapped_pieces):
     # Define valid rows and columns
     rows = "87654321"
@@ -155,7 +513,6 @@ def create_FEN_notation(mapped_pieces):
     return fen_string
 
 def get_center_bottom_bb(transformation, boundingboxes):
-    dimension = 640
     labels = ["b", "k", "n", "p", "q", "r", "B", "K", "N", "P", "Q", "R"]
 
 
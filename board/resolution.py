@@ -0,0 +1,122 @@
+import struct
+import numpy as np
+import cv2
+from board.geometry import DIMENSION
+
+
+# JPEG can be decoded at 1/2, 1/4 and 1/8 size in the DCT domain, which is much cheaper
+# than decoding the full image and resizing it. Other formats are resized after decoding.
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Start of frame markers, the ones that hold the image size
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def decode(image_data, reduction=1):
+    """Decodes encoded image bytes to an RGB array at 1/reduction of the original size.
+
+    Args:
+        image_data (bytes): Encoded image (jpg, png, ...).
+        reduction (int): 1, 2, 4 or 8.
+
+    Returns:
+        np.ndarray: The decoded RGB image, or None if the bytes aren't a valid image.
+    """
+    buffer = np.frombuffer(image_data, dtype=np.uint8)
+    # Ignore the EXIF orientation, just like the images saved through PIL before
+    image = cv2.imdecode(buffer, REDUCED_FLAGS[reduction] | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def jpeg_size(image_data):
+    """Reads the (width, height) of a JPEG from its header without decoding it.
+
+    Returns:
+        tuple: The size, or None if the bytes aren't a JPEG or the header is cut off.
+    """
+    if image_data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 <= len(image_data):
+        if image_data[i] != 0xFF:
+            return None
+        marker = image_data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', image_data[i + 5:i + 9])
+            return width, height
+        length = struct.unpack('>H', image_data[i + 2:i + 4])[0]
+        i += 2 + length
+    return None
+
+def choose_reduction(size, min_size):
+    """Largest reduction that keeps `size` at or above `min_size` pixels, 1 if none does."""
+    for reduction in (8, 4, 2):
+        if size / reduction >= min_size:
+            return reduction
+    return 1
+
+def scale_transform(transform, reduction):
+    """Turns a transformation of an image reduced by `reduction` into one of the full image."""
+    scale = np.diag([1 / reduction, 1 / reduction, 1.0])
+    return np.asarray(transform, dtype=np.float64) @ scale
+
+
+class EncodedImage:
+    """Upload that is decoded at the resolution the pipeline needs instead of at full size.
+
+    Phone photos are often 12 MP while the corner model looks at 640 pixels and the board
+    view is 640x640. JPEG uploads are therefore decoded with DCT scaling at the largest
+    reduction that keeps the shortest side at or above `min_size`. The corner model runs
+    on that image and the board is warped from it as well, unless the board turns out to
+    be so small that its shortest edge has less than `board_size` pixels left; only then
+    the frame is decoded again with more detail. Other formats are decoded at full size.
+
+    Coordinates on the decoded images are converted to full resolution coordinates so
+    the transformations mean the same as for a fully decoded frame.
+
+    Args:
+        image_data (bytes): Encoded image.
+        min_size (int): Minimum shortest side of the reduced decode.
+        board_size (int): Minimum board edge length in the image used for the warp.
+    """
+
+    def __init__(self, image_data, min_size=1280, board_size=DIMENSION):
+        self.data = image_data
+        self.board_size = board_size
+        size = jpeg_size(image_data)
+        self.reduction = choose_reduction(min(size), min_size) if size else 1
+        self.image = decode(image_data, self.reduction)
+
+    @property
+    def valid(self):
+        return self.image is not None
+
+    @property
+    def reducible(self):
+        return jpeg_size(self.data) is not None
+
+    def to_full(self, points):
+        """Converts coordinates on the reduced decode to full resolution coordinates."""
+        return [(x * self.reduction, y * self.reduction) for x, y in points]
+
+    def decode_for_board(self, board_corners):
+        """Returns an image with enough detail for the board given its full resolution corners.
+
+        Returns:
+            tuple: The decoded image and its reduction.
+        """
+        corners = np.asarray(board_corners, dtype=np.float64)
+        shortest_edge = np.linalg.norm(corners - np.roll(corners, 1, axis=0), axis=1).min()
+        reduction = choose_reduction(shortest_edge, self.board_size)
+        if reduction >= self.reduction or not self.reducible:
+            return self.image, self.reduction
+        return decode(self.data, reduction), reduction
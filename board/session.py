@@ -0,0 +1,91 @@
+import chess
+import chess.pgn
+
+def placement_to_squares(placement):
+    """Expands the piece placement part of a FEN to a list of 64 squares (A8, B8, ..., H1).
+
+    Empty squares are ''.
+    """
+    squares = []
+    for row in placement.split(' ')[0].split('/'):
+        for cell in row:
+            if cell.isdigit():
+                squares.extend([''] * int(cell))
+            else:
+                squares.append(cell)
+    if len(squares) != 64:
+        raise ValueError(f"Invalid piece placement: {placement}")
+    return squares
+
+def count_mismatches(squares, other):
+    return sum(a != b for a, b in zip(squares, other))
+
+class GameSession:
+    """Follows a game from a sequence of detected positions, one photo after every move.
+
+    Instead of turning each photo into an independent FEN, every detected position is
+    compared with the positions reachable by one legal move from the current board.
+    The legal move that explains the detection best is played, so castling rights,
+    en passant and the move counters are tracked exactly and the game can be exported
+    as PGN. A detection only has to be right on the squares the move changed: the other
+    squares are compared with the known position, which tolerates misdetections there.
+
+    Args:
+        fen (str, optional): Starting position. Defaults to the standard starting position.
+        max_mismatches (int): Maximum number of squares on which the best matching
+            position may differ from the detection before the detection is rejected.
+    """
+
+    def __init__(self, fen=chess.STARTING_FEN, max_mismatches=2):
+        self.board = chess.Board(fen)
+        self.max_mismatches = max_mismatches
+        self.game = chess.pgn.Game()
+        if fen != chess.STARTING_FEN:
+            self.game.setup(self.board)
+        self.node = self.game
+
+    def match_move(self, placement):
+        """Finds the legal move whose resulting position matches the detected placement best.
+
+        Returns:
+            tuple: The best move (None if not moving matches best) and its number of mismatching squares.
+        """
+        detected = placement_to_squares(placement)
+        best_move = None
+        best_mismatches = count_mismatches(detected, placement_to_squares(self.board.board_fen()))
+
+        for move in self.board.legal_moves:
+            self.board.push(move)
+            mismatches = count_mismatches(detected, placement_to_squares(self.board.board_fen()))
+            self.board.pop()
+            if mismatches < best_mismatches:
+                best_move, best_mismatches = move, mismatches
+
+        return best_move, best_mismatches
+
+    def update(self, placement):
+        """Plays the move that leads to the detected placement.
+
+        Args:
+            placement (str): FEN piece placement as returned by pieces.create_FEN_notation,
+                with white at the bottom.
+
+        Returns:
+            chess.Move: The move that was played, None if the position didn't change or
+            the detection couldn't be explained by a legal move.
+        """
+        move, mismatches = self.match_move(placement)
+        if move is None or mismatches > self.max_mismatches:
+            return None
+
+        self.board.push(move)
+        self.node = self.node.add_variation(move)
+        return move
+
+    def fen(self):
+        """Full FEN of the current position, including castling, en passant and move counters."""
+        return self.board.fen()
+
+    def pgn(self):
+        exporter = chess.pgn.StringExporter(headers=True, variations=False, comments=False)
+        return self.game.accept(exporter)
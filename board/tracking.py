@@ -0,0 +1,58 @@
+import numpy as np
+import cv2
+
+lk_params = dict(
+    winSize=(21, 21),
+    maxLevel=3,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+)
+
+def to_gray(image):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+class CornerTracker:
+    """Tracks the four board corners from frame to frame with pyramidal Lucas-Kanade optical flow.
+
+    Every update also tracks the points back to the previous frame. The forward-backward
+    error tells how reliable the track is: a large error on a single frame means the track
+    is lost, the accumulated error since the last reset is the drift.
+
+    Args:
+        image (np.ndarray): Frame in which the corners were detected.
+        corners (list): The four board corners in that frame.
+        lost_error (float): Forward-backward error in pixels above which the track is lost.
+    """
+
+    def __init__(self, image, corners, lost_error=10.0):
+        self.prev_gray = to_gray(image)
+        self.corners = np.array(corners, dtype=np.float32).reshape(-1, 1, 2)
+        self.lost_error = lost_error
+        self.drift = 0.0
+
+    def update(self, image):
+        """Tracks the corners into a new frame.
+
+        Returns:
+            list: The tracked corners, or None if the track was lost.
+        """
+        gray = to_gray(image)
+        tracked, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.corners, None, **lk_params)
+        if tracked is None or not status.all():
+            return None
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, tracked, None, **lk_params)
+        if back is None or not back_status.all():
+            return None
+
+        error = np.linalg.norm(back - self.corners, axis=2).max()
+        if error > self.lost_error:
+            return None
+
+        self.drift += error
+        self.prev_gray = gray
+        self.corners = tracked
+        return [tuple(point) for point in tracked.reshape(-1, 2)]
+
+    def reset_drift(self):
+        self.drift = 0.0
@@ -0,0 +1,192 @@
+"""
+INT8 post-training quantization of the YOLO models with an accuracy gate.
+
+Every model is exported to ONNX, statically quantized with calibration images and then
+checked: the whole image -> FEN pipeline is run once with the FP32 models and once with
+the quantized model swapped in. The INT8 model is only written when the share of squares
+on which both pipelines disagree stays under the threshold, measured on at least
+`--min_boards` boards the FP32 pipeline could read. Validate on other images than the
+calibration images, otherwise the gate is optimistic.
+
+    python quantize.py --models pieces_large pieces_nano --calibration images/test_images
+"""
+import os
+import json
+import argparse
+import cv2
+import board.corners as corners
+from board.backends import load_model, export_onnx, preprocess
+from board.session import placement_to_squares
+from run_api import images_to_FEN, find_board_corners, warp_board
+
+
+MODEL_PATHS = {
+    'corners': 'models/corners_best_win.pt',
+    'grid': 'models/segment_grid.pt',
+    'pieces_large': 'models/pieces_large.pt',
+    'pieces_nano': 'models/pieces_nano.pt',
+}
+
+
+class ImageCalibrationReader:
+    """Feeds preprocessed calibration images to the ONNX Runtime quantizer one by one."""
+
+    def __init__(self, input_name, images, imgsz=640):
+        self.input_name = input_name
+        self.images = images
+        self.imgsz = imgsz
+        self.index = 0
+
+    def get_next(self):
+        if self.index >= len(self.images):
+            return None
+        batch, _ = preprocess([self.images[self.index]], self.imgsz)
+        self.index += 1
+        return {self.input_name: batch}
+
+    def rewind(self):
+        self.index = 0
+
+
+def read_images(folder):
+    """Reads all images of a folder as RGB arrays, like process_image decodes them."""
+    images = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            image = cv2.imread(os.path.join(folder, filename))
+            if image is not None:
+                images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    return images
+
+def model_inputs(name, images, corners_model, args):
+    """Returns the images the given model sees in the pipeline.
+
+    The corner model sees the original frames, the grid and pieces models see the board
+    view after the first warp.
+    """
+    if name == 'corners':
+        return images
+    views = []
+    results = corners.predict_corners(corners_model, images, args.corner_conf, args.corner_iou)
+    for image, result in zip(images, results):
+        board_corners = find_board_corners(result)
+        if board_corners is not None:
+            views.append(warp_board(image, board_corners, args.offsetx, args.offsety, args.board_dimension)[0])
+    return views
+
+def quantize_model(onnx_path, output_path, calibration_images):
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+    import onnx
+
+    model = load_model(onnx_path, 'onnx')
+    reader = ImageCalibrationReader(model.input_name, calibration_images, model.imgsz)
+    quantize_static(onnx_path, output_path, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    # Keep the ultralytics metadata (imgsz, names, task) so the model loads like the original
+    original = onnx.load(onnx_path)
+    quantized = onnx.load(output_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(original.metadata_props)
+    onnx.save(quantized, output_path)
+
+def square_disagreement(reference_fens, fens):
+    """Share of squares on which two lists of FEN placements disagree.
+
+    Boards the reference couldn't read are skipped, boards only the candidate couldn't
+    read count as completely wrong. Returns 1.0 when the reference read no board at all,
+    so nothing that wasn't checked passes the gate.
+    """
+    wrong, total = 0, 0
+    for reference, fen in zip(reference_fens, fens):
+        if reference is None:
+            continue
+        total += 64
+        if fen is None:
+            wrong += 64
+            continue
+        wrong += sum(a != b for a, b in zip(placement_to_squares(reference), placement_to_squares(fen)))
+    return wrong / total if total else 1.0
+
+def run_pipeline(images, models, args):
+    return images_to_FEN(images, None, models['corners'], models['grid'], models['pieces'],
+                         args.corner_conf, args.corner_iou, args.pieces_conf, args.pieces_iou,
+                         args.offsetx, args.offsety, 'analytic', dimension=args.board_dimension)
+
+
+def parse_args():
+    """Parse input arguments from JSON config file and the command line."""
+    with open("config.json", "r") as f:
+        config = json.load(f)
+    parser = argparse.ArgumentParser(description="Quantize the YOLO models to INT8 with an accuracy gate.")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_PATHS), default=['pieces_large', 'pieces_nano'])
+    parser.add_argument("--calibration", default="images/test_images", help="Folder with calibration images")
+    parser.add_argument("--validation", default=None, help="Folder with images for the accuracy gate, defaults to the calibration folder")
+    parser.add_argument("--min_boards", type=int, default=3,
+                        help="Minimum number of validation boards the FP32 pipeline must read for the gate to pass")
+    parser.add_argument("--max_disagreement", type=float, default=0.01,
+                        help="Maximum share of squares on which the INT8 pipeline may disagree with the FP32 one")
+    args = parser.parse_args()
+    for key, value in config.items():
+        if not hasattr(args, key):
+            setattr(args, key, value)
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    calibration = read_images(args.calibration)
+    validation = read_images(args.validation) if args.validation else calibration
+    if not calibration:
+        raise ValueError(f"No calibration images found in {args.calibration}")
+    print(f"{len(calibration)} calibration images, {len(validation)} validation images")
+    if not args.validation or os.path.abspath(args.validation) == os.path.abspath(args.calibration):
+        print("Warning: validating on the calibration images, the accuracy gate is optimistic. Pass --validation with other images.")
+
+    # FP32 reference pipeline, all models on ONNX Runtime so only the precision differs
+    onnx_paths = {name: export_onnx(path) for name, path in MODEL_PATHS.items() if os.path.exists(path)}
+    reference_pieces = 'pieces_large' if 'pieces_large' in onnx_paths else 'pieces_nano'
+    fp32_models = {
+        'corners': load_model(onnx_paths['corners'], 'onnx'),
+        'grid': load_model(onnx_paths['grid'], 'onnx'),
+        'pieces': load_model(onnx_paths[reference_pieces], 'onnx'),
+    }
+
+    failed = False
+    for name in args.models:
+        if name not in onnx_paths:
+            print(f"{name}: {MODEL_PATHS[name]} not found, skipping")
+            continue
+
+        output_path = os.path.splitext(MODEL_PATHS[name])[0] + '_int8.onnx'
+        candidate_path = os.path.splitext(output_path)[0] + '.candidate.onnx'
+        print(f"{name}: quantizing to {output_path}")
+        quantize_model(onnx_paths[name], candidate_path, model_inputs(name, calibration, fp32_models['corners'], args))
+
+        slot = 'pieces' if name.startswith('pieces') else name
+        models = dict(fp32_models)
+        if slot == 'pieces':
+            models['pieces'] = load_model(onnx_paths[name], 'onnx')
+        reference_fens = run_pipeline(validation, models, args)
+        models[slot] = load_model(candidate_path, 'onnx')
+        fens = run_pipeline(validation, models, args)
+
+        boards = sum(fen is not None for fen in reference_fens)
+        if boards < args.min_boards:
+            print(f"{name}: the FP32 pipeline read only {boards} of the {len(validation)} validation boards, "
+                  f"at least {args.min_boards} are needed to check the INT8 model, not writing it")
+            os.remove(candidate_path)
+            failed = True
+            continue
+        disagreement = square_disagreement(reference_fens, fens)
+        print(f"{name}: {disagreement:.2%} of the squares differ from the FP32 model on {boards} boards")
+        if disagreement > args.max_disagreement:
+            print(f"{name}: above the threshold of {args.max_disagreement:.2%}, not writing the INT8 model")
+            os.remove(candidate_path)
+            failed = True
+            continue
+        os.replace(candidate_path, output_path)
+        print(f"{name}: saved {output_path}")
+
+    if failed:
+        raise SystemExit(1)
@@ -2,4 +2,15 @@
 
 curl -X POST http://192.168.63.176:5000/process_image \
      -H "Content-Type: application/json" \
-     -d '{"image": "base64_encoded_image_data", "player": "b", "white_or_black_top": "black"}'
\ No newline at end of file
+     -d '{"image": "base64_encoded_image_data", "player": "b", "white_or_black_top": "black"}'
+
+# The image can also be sent without base64 encoding, as a file upload:
+
+curl -X POST http://192.168.63.176:5000/process_image \
+     -F "image=@images/test_images/img_1.jpg" -F "player=b" -F "white_or_black_top=black"
+
+# or as the raw request body, with the parameters in the query string:
+
+curl -X POST "http://192.168.63.176:5000/process_image?player=b&white_or_black_top=black" \
+     -H "Content-Type: application/octet-stream" \
+     --data-binary "@images/test_images/img_1.jpg"
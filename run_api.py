@@ -1,49 +1,128 @@
 from flask import Flask, request, send_file, jsonify
-from PIL import Image
 import numpy as np
-import os
-import io
 import base64
+import binascii
 import json
 import argparse
-from ultralytics import YOLO
-from stockfish import Stockfish
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import board.corners as corners
 import board.grid as grid
 import board.pieces as pieces
-import board.moves as moves
+import board.backends as backends
+import board.metrics as metrics
+import board.resolution as resolution
+from board.resolution import EncodedImage
+from board.geometry import DIMENSION
+from board.backends import load_model, BACKENDS, PIECES_MODELS
+from board.cache import LRUCache, upload_hash
+from scheduler import BatchScheduler
 
 app = Flask(__name__)
 
+# Set once the models and engines are loaded and warmed up, see load_pipeline
+ready = threading.Event()
+startup_error = None
 
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-def image_to_FEN(image, white_or_black_top, 
-                 corner_model, grid_model, pieces_model,
-                 corner_conf, corner_iou,
-                 pieces_conf, pieces_iou,
-                 offsetx, offsety, num_points):
+def find_board_corners(corners_result):
+    """Returns the four sorted corners of the board in one corner prediction.
 
-    # Predict corners
-    corners_results = corners.predict_corners(corner_model, image, corner_conf, corner_iou)
+    Args:
+        corners_result: Single ultralytics result of the corner model.
 
-    # Transformation 1
-    corners4 = corners.get_corner_coordinates(corners_results)
+    Returns:
+        list: Corners in the order bottom-left, bottom-right, top-right, top-left,
+        or None if the four corners were not found.
+    """
+    if len(corners_result.boxes) < 4:
+        return None
+    corners4 = corners.get_corner_coordinates([corners_result])
     labeled_corners, sorted_corners = corners.label_and_sort_corners(corners4)
     if labeled_corners is None or sorted_corners is None:
-        print("There was an error in detecting the corners of the board. Please try again.")
-        exit()
-    sorted_corners = corners.add_offset(sorted_corners, offsetx, offsety)
-    transformed_image = corners.transform_image_corners(image, sorted_corners)
-    transformed_image = cv2.cvtColor(transformed_image, cv2.COLOR_BGR2RGB) # convert image back to rgb
-    
-    # Grid detection
-    grid_results = grid.predict_grid_segmentation(grid_model, transformed_image)
-    grid_corners = grid.get_corners_from_grid_segmentation(grid_results)
-    transformed_grid, transformation = grid.make_perspective_transform(transformed_image, grid_corners)
-    transformed_grid = cv2.cvtColor(transformed_grid, cv2.COLOR_BGR2RGB) # convert image back to rgb
+        return None
+    return sorted_corners
+
+def warp_board(image, board_corners, offsetx, offsety, dimension=DIMENSION):
+    """Warps a frame to the dimension x dimension board view given the four sorted board corners.
+
+    Returns:
+        tuple: The warped board and the image -> board transformation matrix.
+    """
+    with metrics.timer('corner_warp'):
+        sorted_corners = corners.add_offset(list(board_corners), offsetx, offsety)
+        transformed_image, corners_transform = corners.transform_image_corners(image, sorted_corners, return_transform=True, dimension=dimension)
+        transformed_image = cv2.cvtColor(transformed_image, cv2.COLOR_BGR2RGB) # convert image back to rgb
+    return transformed_image, corners_transform
+
+def rectify_board(image, corners_result, offsetx, offsety, dimension=DIMENSION):
+    """Warps one frame to the dimension x dimension board view using its corner prediction.
+
+    Args:
+        image (np.ndarray): Original frame.
+        corners_result: Single ultralytics result of the corner model for this frame.
+        offsetx (int): Horizontal offset added around the corners.
+        offsety (int): Vertical offset added around the corners.
+        dimension (int): Size of the board view.
+
+    Returns:
+        tuple: The warped board and the image -> board transformation matrix,
+        (None, None) if the four corners were not found.
+    """
+    board_corners = find_board_corners(corners_result)
+    if board_corners is None:
+        metrics.failure('no_corners')
+        return None, None
+    return warp_board(image, board_corners, offsetx, offsety, dimension)
+
+def rectify_encoded(image, corners_result, offsetx, offsety, dimension=DIMENSION):
+    """rectify_board for an EncodedImage.
+
+    The corners are found on the reduced decode and scaled up, the board is warped from
+    the same decode unless it needs more detail, see EncodedImage.
+
+    Returns:
+        tuple: The warped board, the full resolution image -> board transformation, the
+        decoded image that was warped and the transformation of that image, all None if
+        the four corners were not found.
+    """
+    board_corners = find_board_corners(corners_result)
+    if board_corners is None:
+        metrics.failure('no_corners')
+        return None, None, None, None
+    board_corners = image.to_full(board_corners)
+    with metrics.timer('decode_board'):
+        source, reduction = image.decode_for_board(board_corners)
+    source_corners = [(x / reduction, y / reduction) for x, y in board_corners]
+    transformed_image, source_transform = warp_board(source, source_corners, offsetx / reduction, offsety / reduction, dimension)
+    return transformed_image, resolution.scale_transform(source_transform, reduction), source, source_transform
+
+def locate_grid(image, transformed_image, grid_result, corners_transform, dimension=DIMENSION):
+    """Computes the transformation from the warped board to the 8x8 grid.
+
+    The grid view used for the orientation check is warped straight from the original
+    image with the composed corner and grid transformations, so there is only one
+    resampling step.
+
+    Args:
+        image (np.ndarray): Original frame.
+        transformed_image (np.ndarray): Board view returned by rectify_board.
+        grid_result: Single ultralytics result of the grid segmentation model.
+        corners_transform (np.ndarray): Transformation returned by rectify_board.
+        dimension (int): Size of the board view and of the grid image.
+
+    Returns:
+        np.ndarray: 3x3 perspective transformation matrix from the board view to the grid.
+    """
+    try:
+        grid_corners = grid.get_corners_from_grid_segmentation([grid_result])
+    except Exception:
+        metrics.failure('grid_not_quadrilateral')
+        raise
+    with metrics.timer('grid_warp'):
+        transformation = grid.get_perspective_transform(grid_corners, dimension)
+        transformed_grid, _ = grid.warp_to_grid(image, transformation, corners_transform, dimension)
     
     # Grid Orientation
     # If white top, rotate 180 degrees
@@ -52,44 +131,293 @@ def image_to_FEN(image, white_or_black_top,
     #     transformed_image = cv2.rotate(transformed_image, cv2.ROTATE_180)
         
     # Check if a 90 degree rotation is needed
-    need_rotation = grid.correct_orientation_advanced(transformed_grid)
+    with metrics.timer('orientation'):
+        need_rotation = grid.correct_orientation_advanced(transformed_grid)
     if need_rotation:
         # transformed_grid = cv2.rotate(transformed_grid, cv2.ROTATE_90_CLOCKWISE)
         # transformed_image = cv2.rotate(transformed_image, cv2.ROTATE_90_CLOCKWISE)
         print("Need to rotate 90 degrees, code not optimized yet")
     
+    return transformation
+
+def pieces_to_FEN(pieces_result, transformation, num_points, dimension=DIMENSION):
+    """Maps the detected pieces of one board onto the grid and builds the FEN piece placement."""
+    boxes, labels, confidences = pieces.extract_boxes_labels_confidences([pieces_result])
+    return boxes_to_FEN(boxes, labels, transformation, num_points, confidences, dimension)
+
+def map_boxes(boxes, labels, transformation, num_points, confidences=None, dimension=DIMENSION):
+    """Maps piece boxes in the board view onto the grid.
+
+    `num_points` is either the number of points sampled per piece or 'analytic' to
+    use the deterministic area overlap of each piece footprint. With the detection
+    `confidences` conflicting detections are resolved by score under the chess
+    constraints, see pieces.resolve_scores.
+
+    Returns:
+        list: (square, label) tuples, e.g. ('E4', 'P').
+    """
+    if confidences is not None:
+        return pieces.get_mapped_pieces_resolved(boxes, labels, confidences, transformation, num_points, dimension)
+    if num_points == 'analytic':
+        return pieces.get_mapped_pieces_analytic(boxes, labels, transformation, dimension=dimension)
+    return pieces.get_mapped_pieces_vectorized(boxes, labels, transformation, num_points, dimension)
+
+def boxes_to_FEN(boxes, labels, transformation, num_points, confidences=None, dimension=DIMENSION):
+    """Maps piece boxes in the board view onto the grid and builds the FEN piece placement."""
+    with metrics.timer('mapping'):
+        mapped_pieces = map_boxes(boxes, labels, transformation, num_points, confidences, dimension)
+    with metrics.timer('fen'):
+        fen_notation = pieces.create_FEN_notation(mapped_pieces)
+    
+    return fen_notation
+
+def image_to_FEN(image, white_or_black_top, 
+                 corner_model, grid_model, pieces_model,
+                 corner_conf, corner_iou,
+                 pieces_conf, pieces_iou,
+                 offsetx, offsety, num_points, dimension=DIMENSION):
+
+    # Predict corners
+    with metrics.timer('corners'):
+        corners_results = corners.predict_corners(corner_model, image, corner_conf, corner_iou)
+
+    # Transformation 1
+    transformed_image, corners_transform = rectify_board(image, corners_results[0], offsetx, offsety, dimension)
+    if transformed_image is None:
+        print("There was an error in detecting the corners of the board. Please try again.")
+        exit()
+    
+    # Grid detection
+    with metrics.timer('grid'):
+        grid_results = grid.predict_grid_segmentation(grid_model, transformed_image)
+    transformation = locate_grid(image, transformed_image, grid_results[0], corners_transform, dimension)
+    
     # Piece detection
-    pieces_results = pieces.detect_pieces(pieces_model, transformed_image, pieces_conf, pieces_iou)
-    boxes, labels = pieces.extract_boxes_labels(pieces_results)
-    sampled_points = pieces.get_sampled_points(boxes, labels, num_points)
+    with metrics.timer('pieces'):
+        pieces_results = pieces.detect_pieces(pieces_model, transformed_image, pieces_conf, pieces_iou)
     
-    mapped_pieces = pieces.get_mapped_pieces(sampled_points, transformation)
-    fen_notation = pieces.create_FEN_notation(mapped_pieces)
+    return pieces_to_FEN(pieces_results[0], transformation, num_points, dimension)
+
+def boxes_to_scores(boxes, labels, confidences, transformation, num_points, dimension=DIMENSION):
+    """Maps piece detections onto the grid as an 8x8x12 score tensor, see pieces.piece_scores."""
+    with metrics.timer('mapping'):
+        squares, shares = pieces.map_boxes_with_share(boxes, transformation, num_points, dimension=dimension)
+        return pieces.piece_scores(squares, labels, confidences, shares)
+
+def complete_FEN(placement, player, white_or_black_top):
+    """Full FEN of a detected piece placement, flipped when white is on top."""
+    fen = moves.determineFEN(placement, player)
+    if white_or_black_top == 'white': # if white is on top, flip the FEN
+        fen = moves.correct_fen_for_black_top(fen)
+    return fen
+
+def legal_FEN(result, player, white_or_black_top, k):
+    """Full FEN of a pipeline result, searching for a legal position if needed.
+
+    When python-chess rejects the detected position, the k most probable boards under
+    the detection scores are tried instead (see pieces.decode_legal_board), so an
+    ambiguous detection doesn't cost the client a new photo.
+
+    Args:
+        result (dict): Entry returned by images_to_FEN with return_details.
+        k (int): Number of boards to try, 0 to skip the legality check.
+
+    Returns:
+        tuple: The FEN and its confidence, (None, 0.0) if none of the k boards is legal.
+    """
+    fen = complete_FEN(result["fen"], player, white_or_black_top)
+    if not k or moves.is_legal_position(fen):
+        return fen, result["confidence"]
     
-    return fen_notation
+    def is_legal(placement):
+        return moves.is_legal_position(complete_FEN(placement, player, white_or_black_top))
+    
+    with metrics.timer('legal_search'):
+        decoded = pieces.decode_legal_board(result["scores"], is_legal, k)
+    if decoded is None:
+        return None, 0.0
+    placement, confidence = decoded
+    return complete_FEN(placement, player, white_or_black_top), confidence
+
+def images_to_FEN(images, white_or_black_top, 
+                  corner_model, grid_model, pieces_model,
+                  corner_conf, corner_iou,
+                  pieces_conf, pieces_iou,
+                  offsetx, offsety, num_points, batch_size=16, return_details=False, dimension=DIMENSION):
+    """Batched version of image_to_FEN.
+
+    Every model stage runs once per chunk of `batch_size` boards instead of once per
+    board, the per-board geometry is done afterwards on the results.
+
+    Images are RGB arrays or EncodedImage uploads, which only get decoded at the
+    resolution each stage needs. Boards are rectified to `dimension` x `dimension`
+    pixels, the grid and piece models see that view.
+
+    A board whose geometry or scoring fails only fails itself, the other boards of the
+    batch are still returned; only failing model calls raise.
+
+    Returns:
+        list: FEN piece placement for every image, None for boards where the corners
+        or grid could not be detected or processed. With `return_details` every entry is a dict
+        with the 'fen', the 'corners_transform' and 'grid_transform' matrices, the
+        detected piece 'boxes', 'labels' and 'confidences', the 8x8x12 'scores' tensor
+        and the 'confidence' of the board (see pieces.board_confidence) instead.
+    """
+    images = list(images)
+    fens = [None] * len(images)
+    
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        
+        # Predict corners
+        with metrics.timer('corners'):
+            corner_inputs = [image.image if isinstance(image, EncodedImage) else image for image in chunk]
+            corners_results = corners.predict_corners(corner_model, corner_inputs, corner_conf, corner_iou)
+        
+        # Transformation 1
+        transformed = {}
+        for idx, (image, corners_result) in enumerate(zip(chunk, corners_results)):
+            try:
+                if isinstance(image, EncodedImage):
+                    transformed_image, corners_transform, source, source_transform = rectify_encoded(image, corners_result, offsetx, offsety, dimension)
+                else:
+                    transformed_image, corners_transform = rectify_board(image, corners_result, offsetx, offsety, dimension)
+                    source, source_transform = image, corners_transform
+            except Exception as e:
+                # e.g. a degenerate homography, don't fail the other boards of the batch
+                metrics.failure('board_error')
+                print(f"Image {start + idx}: {e}")
+                continue
+            if transformed_image is None:
+                print(f"Image {start + idx}: there was an error in detecting the corners of the board.")
+                continue
+            transformed[idx] = (transformed_image, corners_transform, source, source_transform)
+        if not transformed:
+            continue
+        
+        # Grid detection
+        valid = list(transformed.keys())
+        with metrics.timer('grid'):
+            grid_results = grid.predict_grid_segmentation(grid_model, [transformed[idx][0] for idx in valid])
+        transformations = {}
+        for idx, grid_result in zip(valid, grid_results):
+            transformed_image, corners_transform, source, source_transform = transformed[idx]
+            try:
+                transformations[idx] = (locate_grid(source, transformed_image, grid_result, source_transform, dimension), corners_transform)
+            except Exception as e:
+                print(f"Image {start + idx}: {e}")
+        if not transformations:
+            continue
+        
+        # Piece detection
+        valid = list(transformations.keys())
+        with metrics.timer('pieces'):
+            pieces_results = pieces.detect_pieces(pieces_model, [transformed[idx][0] for idx in valid], pieces_conf, pieces_iou)
+        for idx, pieces_result in zip(valid, pieces_results):
+            grid_transform, corners_transform = transformations[idx]
+            try:
+                boxes, labels, confidences = pieces.extract_boxes_labels_confidences([pieces_result])
+                scores = boxes_to_scores(boxes, labels, confidences, grid_transform, num_points, dimension)
+                with metrics.timer('fen'):
+                    board = pieces.resolve_scores(scores)
+                    fen = pieces.create_FEN_notation(pieces.board_to_mapped_pieces(board))
+                if return_details:
+                    fen = {"fen": fen, "corners_transform": corners_transform, "grid_transform": grid_transform,
+                           "boxes": boxes, "labels": labels, "confidences": confidences,
+                           "scores": scores, "confidence": pieces.board_confidence(scores, board)}
+            except Exception as e:
+                metrics.failure('board_error')
+                print(f"Image {start + idx}: {e}")
+                continue
+            fens[start + idx] = fen
+    
+    return fens
+
+def decode_image(image_data):
+    """Decodes encoded image bytes (jpg, png, ...) straight to an RGB array without touching the disk.
+
+    Returns:
+        np.ndarray: The decoded RGB image, or None if the bytes aren't a valid image.
+    """
+    return resolution.decode(image_data)
+
+def decode_upload(image_data, min_size=0, board_size=DIMENSION):
+    """Decodes an upload for the pipeline.
+
+    With a `min_size` the upload is wrapped in an EncodedImage, which decodes JPEGs at a
+    reduced size with DCT scaling and only decodes the full image when the board needs it
+    to fill a `board_size` x `board_size` board view.
+
+    Returns:
+        tuple: The image for images_to_FEN (None if the bytes aren't a valid image) and
+        the decoded RGB array.
+    """
+    if min_size:
+        image = EncodedImage(image_data, min_size, board_size)
+        return (image, image.image) if image.valid else (None, None)
+    image = decode_image(image_data)
+    return image, image
+
+def decode_base64(value):
+    """Decodes the base64 image of a JSON body, ignoring the line breaks some encoders add.
+
+    Raises:
+        binascii.Error, ValueError: If the value isn't a valid base64 string.
+    """
+    if not isinstance(value, str):
+        raise ValueError("The image is not a base64 string")
+    return base64.b64decode(''.join(value.split()), validate=True)
+
+def read_request():
+    """Reads the image bytes and parameters of a /process_image request.
+
+    Three body types are accepted:
+        - application/json: {"image": <base64>, "player": ..., "white_or_black_top": ...}
+        - multipart/form-data: an 'image' file with the parameters as form fields
+        - application/octet-stream: the raw image as body with the parameters in the query string
+
+    Returns:
+        tuple: The raw image bytes (None if missing) and a dict with the parameters.
+
+    Raises:
+        binascii.Error, ValueError: If the JSON image isn't valid base64.
+    """
+    if request.mimetype == 'multipart/form-data':
+        file = request.files.get('image')
+        image_data = file.read() if file else None
+        return image_data, request.form
+    
+    if request.mimetype == 'application/octet-stream':
+        return request.get_data(), request.args
+    
+    data = request.get_json(silent=True)
+    if not data or 'image' not in data:
+        return None, {}
+    return decode_base64(data['image']), data
 
 @app.route('/process_image', methods=['POST'])
 def process_image():
     print("ok")
-    data = request.json
-    if not data:
-        return jsonify({"error": "No data sent"}), 400
-    
-    image_data = data['image']
-    image_data = base64.b64decode(image_data)    
-    # print(image_data)
+    if not ready.is_set():
+        return jsonify({"error": "The models are still loading"}), 503, {"Retry-After": "5"}
+    try:
+        image_data, data = read_request()
+    except (binascii.Error, ValueError):
+        metrics.failure('undecodable_image')
+        return jsonify({"error": "Could not decode the image"}), 400
 
     if not image_data:
         return jsonify({"error": "No image has been sent"}), 400
     
-    
-    image = Image.open(io.BytesIO(image_data))
-    file_path = os.path.join(UPLOAD_FOLDER, 'uploaded_image.jpg')
-    image.save(file_path)
-    image = cv2.imread(file_path)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-        
+    # Retries of the exact same upload reuse the earlier result without decoding it again
+    image_hash = upload_hash(image_data) if image_cache is not None else None
+    result = image_cache.get(image_hash) if image_cache is not None else None
+    if result is None:
+        with metrics.timer('decode'):
+            image, _ = decode_upload(image_data, decode_min_size, board_dimension)
+        if image is None:
+            metrics.failure('undecodable_image')
+            return jsonify({"error": "Could not decode the image"}), 400
         
     print("white or black")
     white_or_black_top = data.get('white_or_black_top')
@@ -105,34 +433,145 @@ def process_image():
     # pieces_conf, xoffset, yoffset, piece_samples, stockfish
     print("trying fen")
     
-    fen = image_to_FEN(
-        image, white_or_black_top, corners_model, grid_model, 
-        pieces_model, corner_conf, corner_iou, pieces_conf,
-        pieces_iou,xoffset, yoffset,num_points)
-    
+    if result is None:
+        result = fen_scheduler.submit(image)
+        if result is None:
+            return jsonify({"error": "Could not detect the board"}), 400
+        if image_cache is not None:
+            image_cache.put(image_hash, result)
     
-    print("fen is" + fen)
-    fen = moves.determineFEN(fen, player)
-
-    if white_or_black_top == 'white': # if white is on top, flip the FEN
-        fen = moves.correct_fen_for_black_top(fen)
+    print("fen is" + result["fen"])
+    fen, confidence = legal_FEN(result, player, white_or_black_top, legal_search_k)
+    if fen is None:
+        metrics.failure('illegal_position')
+        return jsonify({"error": "No legal position found"}), 400
         
-    if moves.is_valid_fen(fen):
-        svg_output = moves.output_board_best_move(fen, stockfish, white_or_black_top)
-            
-    else:
+    if not moves.is_valid_fen(fen):
+        metrics.failure('invalid_fen')
         return jsonify({"error": "Invalid FEN notation"}), 400
+    
+    # Repeated positions skip the engine and the rendering
+    cache_key = moves.best_move_cache_key(fen, white_or_black_top, engine_pool.depth, engine_pool.movetime)
+    cached = best_move_cache.get(cache_key)
+    if cached is None:
+        with metrics.timer('stockfish'), engine_pool.engine() as stockfish:
+            move = moves.determine_best_move(fen, stockfish, engine_pool.movetime)
+        if move is None:
+            metrics.failure('no_best_move')
+            return jsonify({"error": "No best move available"}), 400
+        with metrics.timer('render'):
+            svg_output = moves.render_best_move(fen, move, white_or_black_top)
+        best_move_cache.put(cache_key, (move, svg_output))
+    else:
+        move, svg_output = cached
 
     svg_content = svg_output.data
     svg_base64 = base64.b64encode(svg_content.encode('utf-8')).decode('utf-8')
     print("*****************************************************************************************************")
-    return jsonify({"svg": svg_base64}),200
+    return jsonify({"svg": svg_base64, "confidence": confidence}),200
   
 
 @app.route('/hello', methods=['GET'])
 def hello_world():
     return jsonify(message="Hello, World!")
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return metrics.render(), 200, {"Content-Type": metrics.CONTENT_TYPE}
+
+@app.route('/ready', methods=['GET'])
+def readiness():
+    if ready.is_set():
+        return jsonify(ready=True), 200
+    if startup_error is not None:
+        return jsonify(ready=False, error=startup_error), 503
+    return jsonify(ready=False), 503
+
+def load_models(args):
+    """Loads the three models in parallel."""
+    global corners_model, grid_model, pieces_model
+    paths = ['models/corners_best_win.pt', 'models/segment_grid.pt', backends.pieces_model_path(args.pieces_model)]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(load_model, path, args.backend, args.inference_threads) for path in paths]
+        corners_model, grid_model, pieces_model = [future.result() for future in futures]
+    print('Models loaded')
+
+def start_engines(args):
+    """Starts the Stockfish engine pool of this process."""
+    global engine_pool, moves
+    import board.moves as moves
+    from board.engines import StockfishPool
+
+    engine_pool = StockfishPool(args.stockfish_path, size=args.stockfish_engines, depth=args.stockfish_depth,
+                                threads=args.stockfish_threads, movetime=args.stockfish_movetime)
+    print(f"Started {args.stockfish_engines} Stockfish engines")
+
+def setup_serving(args):
+    """Creates the caches and the batch scheduler of this process."""
+    global best_move_cache, image_cache, fen_scheduler, decode_min_size, board_dimension, legal_search_k
+    decode_min_size = args.decode_min_size
+    board_dimension = args.board_dimension
+    legal_search_k = args.legal_search_k
+    best_move_cache = LRUCache(args.best_move_cache_size, args.best_move_cache_ttl, name='best_move')
+    image_cache = None
+    if args.image_cache_size > 0:
+        image_cache = LRUCache(args.image_cache_size, args.image_cache_ttl, name='image')
+    
+    # Requests are grouped into small batches so the models run once per batch
+    fen_scheduler = BatchScheduler(
+        lambda images: images_to_FEN(
+            images, None, corners_model, grid_model,
+            pieces_model, args.corner_conf, args.corner_iou, args.pieces_conf,
+            args.pieces_iou, args.offsetx, args.offsety, args.piece_sampling, return_details=True,
+            dimension=args.board_dimension),
+        max_batch_size=args.batch_max_size, max_wait_ms=args.batch_max_wait_ms,
+        max_pending=args.max_pending_requests)
+    print(f"Requests are batched per {args.batch_max_size}, waiting at most {args.batch_max_wait_ms} ms")
+
+def warm_up_models(args):
+    """Runs every model once so the first request doesn't pay for lazy initialisation."""
+    dummy = np.zeros((args.board_dimension, args.board_dimension, 3), dtype=np.uint8)
+    corners.predict_corners(corners_model, dummy, args.corner_conf, args.corner_iou)
+    grid.predict_grid_segmentation(grid_model, dummy)
+    pieces.detect_pieces(pieces_model, dummy, args.pieces_conf, args.pieces_iou)
+
+def warm_up(args):
+    """Runs every model and the engine once so the first request doesn't pay for lazy initialisation."""
+    warm_up_models(args)
+    with engine_pool.engine() as stockfish:
+        moves.determine_best_move(moves.determineFEN("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR", 'w'), stockfish, engine_pool.movetime)
+
+def load_pipeline(args):
+    """Loads the models and Stockfish engines in parallel and warms them up.
+
+    Runs on a background thread so the server answers /hello right away. The heavy
+    imports (ultralytics/torch or onnxruntime, stockfish, chess) also happen here.
+    /ready and /process_image become available once this finishes.
+    """
+    global startup_error
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            models_future = executor.submit(load_models, args)
+            engines_future = executor.submit(start_engines, args)
+            models_future.result()
+            engines_future.result()
+        warm_up(args)
+        ready.set()
+        print('API ready')
+        print('-----------------------------------------------------------------------------')
+    except Exception as e:
+        startup_error = str(e)
+        print(f"Loading the pipeline failed: {e}")
+
+def validate_args(args):
+    if args.pieces_model not in PIECES_MODELS:
+        raise ValueError(f"Invalid model: {args.pieces_model}")
+    if args.backend not in BACKENDS:
+        raise ValueError(f"Invalid backend: {args.backend}")
+    if args.piece_sampling != 'analytic' and not isinstance(args.piece_sampling, int):
+        raise ValueError(f"Invalid piece sampling: {args.piece_sampling}")
+    if not isinstance(args.board_dimension, int) or args.board_dimension <= 0 or args.board_dimension % 8:
+        raise ValueError(f"Invalid board dimension: {args.board_dimension}")
         
 def parse_args():
     """Parse input arguments from JSON config file."""
@@ -166,42 +605,19 @@ if __name__ == '__main__':
     print('Loading API arguments')
     print('-----------------------------------------------------------------------------')
 
-    piece_model = args.pieces_model
-    piece_samples = args.piece_sampling
-    corner_conf = args.corner_conf
-    corner_iou = args.corner_iou
-    pieces_conf = args.pieces_conf  
-    pieces_iou = args.pieces_iou
-    xoffset = args.offsetx
-    yoffset = args.offsety
-    stockfish_path = args.stockfish_path
-    debugg = args.debug
-    num_points = 10
-
-    debug = False
-    if debugg == "True":
-        debug = True
-        
-    if piece_model not in ['large', 'nano']:
-        raise ValueError(f"Invalid model: {piece_model}")
+    validate_args(args)
     
-    print(f"Pieces are detected using: {piece_model} YOLO8 model")
-    print(f"Mapping pieces to grid is done by using {piece_samples} samples")
+    print(f"Pieces are detected using: {args.pieces_model} YOLO8 model")
+    print(f"Models are run with the {args.backend} backend")
+    if args.piece_sampling == 'analytic':
+        print("Mapping pieces to grid is done by using the analytic footprint overlap")
+    else:
+        print(f"Mapping pieces to grid is done by using {args.piece_sampling} samples")
     print('-----------------------------------------------------------------------------')
-    
-    corners_model_path = 'models/corners_best_win.pt'
-    grid_model_path = 'models/segment_grid.pt'
-    if piece_model == 'large':
-        pieces_model_path = 'models/pieces_large.pt'
-    if piece_model == 'nano':
-        pieces_model_path = 'models/pieces_nano.pt'
 
-    corners_model = YOLO(corners_model_path, verbose=False)
-    grid_model = YOLO(grid_model_path, verbose=False)
-    pieces_model = YOLO(pieces_model_path, verbose=False) 
-    
-    print('Models loaded')
-    print('-----------------------------------------------------------------------------')
-    stockfish = Stockfish(stockfish_path)
+    # Models and engines load in the background, /ready tells when they are warmed up
+    threading.Thread(target=load_pipeline, name="load-pipeline", daemon=True, args=(args,)).start()
+    setup_serving(args)
 
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # The reloader would start a second process that loads everything again
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
@@ -0,0 +1,233 @@
+"""
+Asyncio (ASGI) variant of the API with the same endpoints as run_api.py.
+
+Requests don't hold a thread while they wait: base64 and image decoding, the legal
+position search and rendering run on a bounded thread pool, inference goes through
+the batch scheduler (awaited, not blocked on) and Stockfish is driven over
+non-blocking UCI pipes. When more than `max_pending_requests`
+requests are in flight the server answers 429 with a Retry-After header.
+
+    uvicorn run_asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+import asyncio
+import base64
+import binascii
+import contextlib
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+import run_api
+import board.moves as moves
+import board.metrics as metrics
+from board.cache import upload_hash
+from board.engines import AsyncStockfishPool
+
+
+def busy():
+    return JSONResponse({"error": "Too many requests, try again later"}, status_code=429, headers={"Retry-After": "1"})
+
+def decode(image_data):
+    with metrics.timer('decode'):
+        image, _ = run_api.decode_upload(image_data, run_api.decode_min_size, run_api.board_dimension)
+    return image
+
+def read_upload(image_data, hashed):
+    """Base64-decodes the image of a JSON body and hashes the upload for the image cache.
+
+    Runs on the thread pool, for large uploads both take milliseconds.
+
+    Returns:
+        tuple: The raw image bytes and their hash (None if not hashed).
+
+    Raises:
+        binascii.Error, ValueError: If the JSON image isn't valid base64.
+    """
+    if isinstance(image_data, (bytes, bytearray)):
+        image_data = bytes(image_data)
+    else:
+        image_data = run_api.decode_base64(image_data)
+    return image_data, upload_hash(image_data) if hashed and image_data else None
+
+def legal_fen(result, player, white_or_black_top, k):
+    """run_api.legal_FEN plus the FEN validation, run on the thread pool.
+
+    Returns:
+        tuple: The FEN, its confidence and whether python-chess accepts the FEN.
+    """
+    fen, confidence = run_api.legal_FEN(result, player, white_or_black_top, k)
+    return fen, confidence, fen is not None and moves.is_valid_fen(fen)
+
+def encode_svg(svg_output):
+    return base64.b64encode(svg_output.data.encode('utf-8')).decode('utf-8')
+
+async def read_request(request):
+    """Async version of run_api.read_request, accepting the same three body types.
+
+    Only the body is read here, the image of a JSON body is returned still base64
+    encoded so it can be decoded off the event loop, see read_upload.
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    if content_type == 'multipart/form-data':
+        form = await request.form()
+        file = form.get('image')
+        image_data = await file.read() if file is not None else None
+        return image_data, form
+
+    if content_type == 'application/octet-stream':
+        return await request.body(), request.query_params
+
+    try:
+        data = await request.json()
+    except ValueError:
+        return None, {}
+    if not data or 'image' not in data:
+        return None, {}
+    return data['image'], data
+
+class API:
+    def __init__(self, args):
+        self.args = args
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+        self.engine_pool = AsyncStockfishPool(args.stockfish_path, size=args.stockfish_engines, depth=args.stockfish_depth,
+                                              threads=args.stockfish_threads, movetime=args.stockfish_movetime)
+        self.in_flight = 0
+
+    async def startup(self):
+        run_api.setup_serving(self.args)
+        # run_api.start_engines isn't used here, the engines are driven asynchronously
+        run_api.moves = moves
+        # Load in the background so /hello answers right away
+        asyncio.get_running_loop().create_task(self.load())
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(loop.run_in_executor(self.executor, run_api.load_models, self.args),
+                                 self.engine_pool.start())
+            await loop.run_in_executor(self.executor, run_api.warm_up_models, self.args)
+            run_api.ready.set()
+            print('API ready')
+        except Exception as e:
+            run_api.startup_error = str(e)
+            print(f"Loading the pipeline failed: {e}")
+
+    async def shutdown(self):
+        await self.engine_pool.close()
+        self.executor.shutdown(wait=False)
+
+    async def hello(self, request):
+        return JSONResponse({"message": "Hello, World!"})
+
+    async def metrics(self, request):
+        return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    async def ready(self, request):
+        if run_api.ready.is_set():
+            return JSONResponse({"ready": True})
+        content = {"ready": False}
+        if run_api.startup_error is not None:
+            content["error"] = run_api.startup_error
+        return JSONResponse(content, status_code=503)
+
+    async def process_image(self, request):
+        if not run_api.ready.is_set():
+            return JSONResponse({"error": "The models are still loading"}, status_code=503, headers={"Retry-After": "5"})
+        if self.in_flight >= self.args.max_pending_requests:
+            return busy()
+        self.in_flight += 1
+        try:
+            return await self._process_image(request)
+        finally:
+            self.in_flight -= 1
+
+    async def _process_image(self, request):
+        loop = asyncio.get_running_loop()
+        image_data, data = await read_request(request)
+        if not image_data:
+            return JSONResponse({"error": "No image has been sent"}, status_code=400)
+
+        white_or_black_top = data.get('white_or_black_top')
+        player = data.get('player')
+        if player not in ['w', 'b']:
+            return JSONResponse({"error": "Invalid player value"}, status_code=400)
+
+        # Retries of the exact same upload reuse the earlier result without decoding it again
+        image_cache = run_api.image_cache
+        try:
+            image_data, image_hash = await loop.run_in_executor(self.executor, read_upload, image_data, image_cache is not None)
+        except (binascii.Error, ValueError):
+            metrics.failure('undecodable_image')
+            return JSONResponse({"error": "Could not decode the image"}, status_code=400)
+        if not image_data:
+            return JSONResponse({"error": "No image has been sent"}, status_code=400)
+        result = image_cache.get(image_hash) if image_cache is not None else None
+        if result is None:
+            image = await loop.run_in_executor(self.executor, decode, image_data)
+            if image is None:
+                metrics.failure('undecodable_image')
+                return JSONResponse({"error": "Could not decode the image"}, status_code=400)
+            try:
+                future = run_api.fen_scheduler.enqueue(image)
+            except queue.Full:
+                return busy()
+            result = await asyncio.wrap_future(future)
+            if result is None:
+                return JSONResponse({"error": "Could not detect the board"}, status_code=400)
+            if image_cache is not None:
+                image_cache.put(image_hash, result)
+
+        fen, confidence, valid = await loop.run_in_executor(self.executor, legal_fen, result, player, white_or_black_top,
+                                                            self.args.legal_search_k)
+        if fen is None:
+            metrics.failure('illegal_position')
+            return JSONResponse({"error": "No legal position found"}, status_code=400)
+        if not valid:
+            metrics.failure('invalid_fen')
+            return JSONResponse({"error": "Invalid FEN notation"}, status_code=400)
+
+        cache_key = moves.best_move_cache_key(fen, white_or_black_top, self.engine_pool.depth, self.engine_pool.movetime)
+        cached = run_api.best_move_cache.get(cache_key)
+        if cached is None:
+            with metrics.timer('stockfish'):
+                move = await self.engine_pool.best_move(fen)
+            if move is None:
+                metrics.failure('no_best_move')
+                return JSONResponse({"error": "No best move available"}, status_code=400)
+            with metrics.timer('render'):
+                svg_output = await loop.run_in_executor(self.executor, moves.render_best_move, fen, move, white_or_black_top)
+            run_api.best_move_cache.put(cache_key, (move, svg_output))
+        else:
+            move, svg_output = cached
+
+        svg_base64 = await loop.run_in_executor(self.executor, encode_svg, svg_output)
+        return JSONResponse({"svg": svg_base64, "confidence": confidence})
+
+
+def create_app(args):
+    run_api.validate_args(args)
+    api = API(args)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await api.startup()
+        yield
+        await api.shutdown()
+
+    return Starlette(
+        routes=[
+            Route('/process_image', api.process_image, methods=['POST']),
+            Route('/hello', api.hello, methods=['GET']),
+            Route('/ready', api.ready, methods=['GET']),
+            Route('/metrics', api.metrics, methods=['GET']),
+        ],
+        lifespan=lifespan,
+    )
+
+app = create_app(run_api.parse_args())
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,165 @@
+import json
+import argparse
+import time
+import cv2
+import board.corners as corners
+import board.grid as grid
+import board.pieces as pieces
+import board.moves as moves
+from board.session import GameSession
+from board.geometry import DIMENSION
+from board.backends import load_model, pieces_model_path
+from board.tracking import CornerTracker
+from board.changes import SquareChangeDetector, grid_view, merge_mapped_pieces
+from run_api import find_board_corners, warp_board, locate_grid, map_boxes
+
+
+def read_frames(video_path):
+    """Yields the frames of a video file (or camera index) as RGB images."""
+    capture = cv2.VideoCapture(video_path)
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
+def stream_to_FEN(frames,
+                  corner_model, grid_model, pieces_model,
+                  corner_conf, corner_iou,
+                  pieces_conf, pieces_iou,
+                  offsetx, offsety, num_points,
+                  max_drift=5.0, keyframe_interval=None, change_threshold=None, dimension=DIMENSION):
+    """Converts a stream of frames of the same board to FEN notations.
+
+    Corners and grid are only detected on a keyframe. On the following frames the board
+    corners are tracked with optical flow, so the only model that runs per frame is the
+    piece detector. The grid is segmented again when the accumulated tracking drift
+    exceeds `max_drift` pixels, and a new keyframe is made when the track is lost.
+
+    With a `change_threshold` the frames are compared square by square with the frame
+    of the last piece detection. The piece detector is skipped when no square changed,
+    and otherwise only the changed squares take the new detections.
+
+    Args:
+        frames (iterable): RGB frames, e.g. from read_frames.
+        max_drift (float): Accumulated forward-backward tracking error in pixels after
+            which the grid is segmented again.
+        keyframe_interval (int, optional): Force a keyframe every this many frames.
+        change_threshold (float, optional): Mean absolute pixel difference (0-255) above
+            which a square counts as changed. None runs the piece detector on every frame.
+        dimension (int): Size of the rectified board view.
+
+    Yields:
+        str: FEN piece placement per frame, None for frames where the board wasn't found.
+    """
+    tracker = None
+    grid_transform = None
+    frames_since_keyframe = 0
+    change_detector = SquareChangeDetector(change_threshold) if change_threshold is not None else None
+    mapped_pieces = None
+
+    for frame in frames:
+        if keyframe_interval and frames_since_keyframe >= keyframe_interval:
+            tracker = None
+
+        board_corners = tracker.update(frame) if tracker is not None else None
+        if board_corners is None:
+            # Keyframe: detect the corners and the grid from scratch
+            tracker = None
+            corners_results = corners.predict_corners(corner_model, frame, corner_conf, corner_iou)
+            board_corners = find_board_corners(corners_results[0])
+            if board_corners is None:
+                yield None
+                continue
+            tracker = CornerTracker(frame, board_corners)
+            grid_transform = None
+            frames_since_keyframe = 0
+        frames_since_keyframe += 1
+
+        transformed_image, corners_transform = warp_board(frame, board_corners, offsetx, offsety, dimension)
+
+        if grid_transform is None or tracker.drift > max_drift:
+            grid_results = grid.predict_grid_segmentation(grid_model, transformed_image)
+            try:
+                grid_transform = locate_grid(frame, transformed_image, grid_results[0], corners_transform, dimension)
+            except Exception as e:
+                print(e)
+                tracker = None
+                yield None
+                continue
+            tracker.reset_drift()
+            if change_detector is not None:
+                change_detector.reset()
+
+        changed = None
+        if change_detector is not None:
+            view = grid_view(frame, grid_transform, corners_transform, dimension=dimension)
+            changed = change_detector.changed_squares(view)
+            if mapped_pieces is not None and not changed.any():
+                yield pieces.create_FEN_notation(mapped_pieces)
+                continue
+
+        pieces_results = pieces.detect_pieces(pieces_model, transformed_image, pieces_conf, pieces_iou)
+        boxes, labels, confidences = pieces.extract_boxes_labels_confidences(pieces_results)
+        new_pieces = map_boxes(boxes, labels, grid_transform, num_points, confidences, dimension)
+        if changed is not None:
+            if mapped_pieces is not None:
+                new_pieces = merge_mapped_pieces(mapped_pieces, new_pieces, changed)
+            change_detector.commit(view)
+        mapped_pieces = new_pieces
+        yield pieces.create_FEN_notation(mapped_pieces)
+
+
+def parse_args():
+    """Parse input arguments from JSON config file and the command line."""
+    with open("config.json", "r") as f:
+        config = json.load(f)
+    parser = argparse.ArgumentParser(description="Convert a video of a chess game to FEN notations.")
+    parser.add_argument("video", help="Path to a video file or index of a camera")
+    parser.add_argument("--max_drift", type=float, default=5.0)
+    parser.add_argument("--keyframe_interval", type=int, default=None)
+    parser.add_argument("--change_threshold", type=float, default=None,
+                        help="Only detect pieces again when a square changed by more than this mean pixel difference")
+    parser.add_argument("--white_or_black_top", choices=["white", "black"], default="black")
+    parser.add_argument("--record", action="store_true", help="Follow the game from the starting position and print its PGN")
+    args = parser.parse_args()
+    for key, value in config.items():
+        setattr(args, key, value)
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    corners_model = load_model('models/corners_best_win.pt', args.backend)
+    grid_model = load_model('models/segment_grid.pt', args.backend)
+    pieces_model = load_model(pieces_model_path(args.pieces_model), args.backend)
+
+    video = int(args.video) if args.video.isdigit() else args.video
+
+    session = GameSession() if args.record else None
+    previous_fen = None
+    frame_count = 0
+    start = time.time()
+    for fen in stream_to_FEN(read_frames(video), corners_model, grid_model, pieces_model,
+                             args.corner_conf, args.corner_iou, args.pieces_conf, args.pieces_iou,
+                             args.offsetx, args.offsety, args.piece_sampling,
+                             args.max_drift, args.keyframe_interval, args.change_threshold, args.board_dimension):
+        frame_count += 1
+        if fen is None or fen == previous_fen:
+            continue
+        previous_fen = fen
+        if args.white_or_black_top == 'white':
+            fen = moves.correct_fen_for_black_top(fen)
+        print(f"Frame {frame_count}: {fen}")
+        if session is not None:
+            move = session.update(fen)
+            if move is not None:
+                print(f"Frame {frame_count}: played {move.uci()} -> {session.fen()}")
+
+    elapsed = time.time() - start
+    print(f"Processed {frame_count} frames in {elapsed:.2f} seconds ({frame_count / max(elapsed, 1e-9):.1f} fps)")
+    if session is not None:
+        print(session.pgn())
@@ -0,0 +1,82 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """Groups concurrent requests into small batches in front of a batched function.
+
+    Callers block in `submit` while a single background thread collects queued items
+    until either `max_batch_size` items are waiting or `max_wait_ms` has passed since the
+    first item of the batch arrived. The whole batch is then handed to `process_batch`
+    once and every caller receives its own result.
+
+    Args:
+        process_batch (callable): Takes a list of items and returns a list of results
+            in the same order.
+        max_batch_size (int): Maximum number of items processed together.
+        max_wait_ms (float): Maximum time the first item of a batch waits for company.
+        max_pending (int): Maximum number of queued items, 0 for no limit. `enqueue` raises
+            queue.Full beyond it so callers can shed load.
+    """
+
+    def __init__(self, process_batch, max_batch_size=8, max_wait_ms=10, max_pending=0):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000)
+        self._queue = queue.Queue(maxsize=max(0, int(max_pending)))
+        self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, item, timeout=None):
+        """Queues an item and blocks until its result is available.
+
+        Exceptions raised by `process_batch` are re-raised in every caller of that batch.
+        """
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout=timeout)
+
+    def enqueue(self, item):
+        """Queues an item without blocking.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the result, await it with asyncio.wrap_future.
+
+        Raises:
+            queue.Full: If `max_pending` items are already waiting.
+        """
+        future = Future()
+        self._queue.put_nowait((item, future))
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
@@ -0,0 +1,117 @@
+"""
+Production serving with several worker processes that share the models.
+
+The models are loaded and warmed up once in the parent process, before forking, so
+every worker maps the same weights copy-on-write instead of holding its own copy. Each worker
+then starts its own Stockfish engines, caches and batch scheduler, warms up and
+accepts connections on the listening socket it inherited from the parent. A frame
+never leaves the worker that decoded it, so nothing has to be pickled or copied
+between processes.
+
+    python serve.py --workers 4 --port 5000
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+from werkzeug.serving import make_server
+import run_api
+import board.metrics as metrics
+
+
+# Workers that exit sooner than this after being started are considered broken (e.g. a
+# bad stockfish_path), respawning them would only fail again
+MIN_UPTIME = 10.0
+# Longest wait before replacing a worker that died, the wait doubles per quick succession of deaths
+MAX_BACKOFF = 30.0
+
+
+def run_worker(args, server):
+    """Per-process initialisation after the fork, then serve until terminated."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    metrics.reset()
+    run_api.start_engines(args)
+    run_api.setup_serving(args)
+    run_api.warm_up(args)
+    run_api.ready.set()
+    print(f"Worker {os.getpid()} ready")
+    server.serve_forever()
+
+def spawn_worker(args, server):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(args, server)
+        except BaseException as e:
+            print(f"Worker {os.getpid()} stopped: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+def serve(args, workers, host, port):
+    # Threads inside the runtimes don't survive a fork, so every worker runs its models
+    # single threaded unless configured otherwise and parallelism comes from the workers
+    if not args.inference_threads:
+        args.inference_threads = 1
+    run_api.load_models(args)
+    # The first prediction sets up the runtime and, for ultralytics, fuses Conv+BN into
+    # new weight tensors. Done here, the fused weights are shared instead of copied per worker.
+    run_api.warm_up_models(args)
+
+    server = make_server(host, port, run_api.app, threaded=True)
+    print(f"Listening on {host}:{port} with {workers} workers")
+    children = {}  # pid -> start time
+    for _ in range(workers):
+        children[spawn_worker(args, server)] = time.monotonic()
+
+    def stop_workers():
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def stop(signum, frame):
+        stop_workers()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Replace workers that die, with a growing delay when they keep dying
+    backoff, last_death = 0.0, None
+    while True:
+        pid, status = os.wait()
+        started = children.pop(pid, None)
+        if started is None:
+            continue
+        now = time.monotonic()
+        if now - started < MIN_UPTIME:
+            print(f"Worker {pid} exited with status {status} {now - started:.1f} s after starting, stopping the server")
+            stop_workers()
+            sys.exit(1)
+        recent = last_death is not None and now - last_death < 2 * MAX_BACKOFF
+        backoff = min(MAX_BACKOFF, backoff * 2) if recent and backoff else 1.0
+        last_death = now
+        print(f"Worker {pid} exited with status {status}, starting a new one in {backoff:.0f} s")
+        time.sleep(backoff)
+        children[spawn_worker(args, server)] = time.monotonic()
+
+
+def parse_args():
+    """Parse input arguments from the command line and the JSON config file."""
+    parser = argparse.ArgumentParser(description="Serve the ChessVision API with several worker processes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    cli = parser.parse_args()
+    return cli, run_api.parse_args()
+
+if __name__ == '__main__':
+    cli, args = parse_args()
+    run_api.validate_args(args)
+    serve(args, cli.workers, cli.host, cli.port)